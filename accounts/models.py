@@ -1,7 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.urls import reverse
-from PIL import Image
 
 class User(AbstractUser):
     """Extended User model with roles and profile information"""
@@ -73,16 +72,35 @@ class User(AbstractUser):
     def can_view_all_orders(self):
         return self.role == 'admin' or self.is_superuser
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Avatar file name as loaded
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
+    
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        saves_avatar = update_fields is None or 'avatar' in update_fields
         super().save(*args, **kwargs)
         
-        # Resize avatar image
-        if self.avatar:
-            img = Image.open(self.avatar.path)
-            if img.height > 300 or img.width > 300:
-                output_size = (300, 300)
-                img.thumbnail(output_size)
-                img.save(self.avatar.path)
+        # Resize a newly saved avatar in the background; other saves, such
+        # as the last_login update on every login, leave it alone
+        if saves_avatar and self.avatar and self.avatar.name != getattr(self, '_loaded_avatar', None):
+            from products.renditions import run_in_background
+            run_in_background(resize_avatar, self.pk)
+        if saves_avatar:
+            self._loaded_avatar = self.avatar.name
+
+
+def resize_avatar(user_id, max_size=300):
+    """Shrink a user's avatar in place to fit within max_size"""
+    from products.imaging import shrink_file
+    
+    user = User.objects.filter(pk=user_id).only('avatar').first()
+    if not user or not user.avatar:
+        return
+    shrink_file(user.avatar.path, max_size)
 
 
 class UserProfile(models.Model):
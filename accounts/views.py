@@ -232,6 +232,6 @@ def user_detail_view(request, username):
         context['products'] = Product.objects.filter(
             vendor=user, 
             is_active=True
-        )[:6]
+        ).for_listing()[:6]
     
     return render(request, 'accounts/user_detail.html', context)
\ No newline at end of file
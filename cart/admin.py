@@ -1,15 +1,39 @@
 from django.contrib import admin
+from . import totals
 from .models import Cart, CartItem
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_items', 'total_price', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'user__email']
     readonly_fields = ['total_items', 'total_price']
 
+    def get_queryset(self, request):
+        # Both totals for every row in the changelist's one query
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Total items', ordering='items_count')
+    def total_items(self, obj):
+        return obj.total_items
+
+    @admin.display(description='Total price', ordering='items_total')
+    def total_price(self, obj):
+        return obj.total_price
+
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ['cart', 'product', 'quantity', 'get_total_price']
     list_filter = ['created_at']
-    search_fields = ['product__name', 'cart__user__username']
\ No newline at end of file
+    list_select_related = ['cart__user', 'product']
+    search_fields = ['product__name', 'cart__user__username']
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        totals.invalidate(obj.cart.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('cart__user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        totals.invalidate(*user_ids)
@@ -1,11 +1,74 @@
 from decimal import Decimal
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.functional import cached_property
 from products.models import Product
+from . import models, totals
 
-class Cart:
+
+def get_cart(request):
+    """The cart of the request: stored in the database once the user logs in, else in the session"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return DatabaseCart(user)
+    return SessionCart(request)
+
+
+class BaseCart:
+    """
+    Cart operations shared by the backends. self.cart maps product ids, as
+    strings, to dicts of quantity and the price and price_version captured
+    when the product was added.
+    """
+
+    def __init__(self):
+        # Items with their products and Decimal totals, built once by __iter__
+        self._items = None
+
+    def save(self):
+        """Forget what was derived from the cart's contents"""
+        self._items = None
+
+    def __iter__(self):
+        """Iterate over the items in the cart and get the products from the database"""
+        if self._items is None:
+            product_ids = self.cart.keys()
+            products = Product.objects.filter(id__in=product_ids).with_main_image()
+            # Copies, so the session keeps only JSON-serializable values
+            cart = {product_id: dict(item) for product_id, item in self.cart.items()}
+
+            for product in products:
+                cart[str(product.id)]['product'] = product
+
+            for item in cart.values():
+                item['price'] = Decimal(item['price'])
+                item['total_price'] = item['price'] * item['quantity']
+            self._items = list(cart.values())
+        return iter(self._items)
+
+    def quantities(self):
+        """Map of product id to quantity"""
+        return {int(product_id): item['quantity'] for product_id, item in self.cart.items()}
+
+    def __len__(self):
+        """Count all items in the cart"""
+        return sum(item['quantity'] for item in self.cart.values())
+
+    def get_total_price(self):
+        """Calculate the total cost of the cart"""
+        if self._items is not None:
+            return sum(item['total_price'] for item in self._items)
+        return sum(Decimal(item['price']) * item['quantity']
+                  for item in self.cart.values())
+
+
+class SessionCart(BaseCart):
     """Session-based cart for anonymous users"""
-    
+
     def __init__(self, request):
+        super().__init__()
         self.session = request.session
         cart = self.session.get(settings.CART_SESSION_ID)
         if not cart:
@@ -18,7 +81,8 @@ class Cart:
         if product_id not in self.cart:
             self.cart[product_id] = {
                 'quantity': 0,
-                'price': str(product.price)
+                'price': str(product.price),
+                'price_version': product.price_version
             }
         if override_quantity:
             self.cart[product_id]['quantity'] = quantity
@@ -28,6 +92,7 @@ class Cart:
 
     def save(self):
         """Mark the session as modified"""
+        super().save()
         self.session.modified = True
 
     def remove(self, product):
@@ -37,30 +102,108 @@ class Cart:
             del self.cart[product_id]
             self.save()
 
-    def __iter__(self):
-        """Iterate over the items in the cart and get the products from the database"""
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        
+    def update_prices(self, products):
+        """Charge the current price of products already in the cart"""
         for product in products:
-            cart[str(product.id)]['product'] = product
+            item = self.cart.get(str(product.id))
+            if item:
+                item['price'] = str(product.price)
+                item['price_version'] = product.price_version
+        self.save()
 
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+    def clear(self):
+        """Remove cart from session"""
+        del self.session[settings.CART_SESSION_ID]
+        self.save()
+
+
+class DatabaseCart(BaseCart):
+    """Cart of a logged-in user, one CartItem row per product"""
+
+    def __init__(self, user):
+        super().__init__()
+        self.user = user
+
+    @cached_property
+    def rows(self):
+        """The user's CartItems by product id, loaded in one query"""
+        items = models.CartItem.objects.filter(cart__user=self.user).only(
+            'pk', 'cart_id', 'product_id', 'quantity', 'price', 'price_version'
+        )
+        return {str(item.product_id): item for item in items}
+
+    @cached_property
+    def cart(self):
+        """The rows as BaseCart expects them, built once per load"""
+        return {
+            product_id: {
+                'quantity': item.quantity,
+                'price': str(item.price),
+                'price_version': item.price_version
+            }
+            for product_id, item in self.rows.items()
+        }
+
+    def save(self):
+        """Reload the items and totals the next time they're needed"""
+        super().save()
+        self.__dict__.pop('rows', None)
+        self.__dict__.pop('cart', None)
+        totals.invalidate(self.user.pk)
 
     def __len__(self):
         """Count all items in the cart"""
-        return sum(item['quantity'] for item in self.cart.values())
+        if 'rows' not in self.__dict__:
+            return totals.get_totals(self.user.pk)['items_count']
+        return super().__len__()
 
     def get_total_price(self):
         """Calculate the total cost of the cart"""
-        return sum(Decimal(item['price']) * item['quantity'] 
-                  for item in self.cart.values())
+        if self._items is None and 'rows' not in self.__dict__:
+            return totals.get_totals(self.user.pk)['items_total']
+        return super().get_total_price()
+
+    def add(self, product, quantity=1, override_quantity=False):
+        """Add a product to the cart or update its quantity, writing only its row"""
+        items = models.CartItem.objects.filter(cart__user=self.user, product=product)
+        if override_quantity:
+            change = {'quantity': quantity}
+        else:
+            change = {'quantity': F('quantity') + quantity}
+        if not items.update(**change, updated_at=timezone.now()):
+            cart, _ = models.Cart.objects.get_or_create(user=self.user)
+            try:
+                with transaction.atomic():
+                    models.CartItem.objects.create(
+                        cart=cart,
+                        product=product,
+                        quantity=quantity,
+                        price=product.price,
+                        price_version=product.price_version
+                    )
+            except IntegrityError:
+                # Added concurrently, e.g. from another device: add to that row
+                items.update(**change, updated_at=timezone.now())
+        self.save()
+
+    def remove(self, product):
+        """Remove a product from the cart"""
+        models.CartItem.objects.filter(cart__user=self.user, product=product).delete()
+        self.save()
+
+    def update_prices(self, products):
+        """Charge the current price of products already in the cart"""
+        items = []
+        for product in products:
+            item = self.rows.get(str(product.id))
+            if item:
+                item.price = product.price
+                item.price_version = product.price_version
+                items.append(item)
+        models.CartItem.objects.bulk_update(items, ['price', 'price_version'])
+        self.save()
 
     def clear(self):
-        """Remove cart from session"""
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
\ No newline at end of file
+        """Remove every item from the cart"""
+        models.CartItem.objects.filter(cart__user=self.user).delete()
+        self.save()
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .totals import get_totals
+
+
+def cart(request):
+    """Cart badge count, read from the session or the cached cart totals without loading any products"""
+    def count():
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return get_totals(user.pk)['items_count']
+        items = request.session.get(settings.CART_SESSION_ID) or {}
+        return sum(item['quantity'] for item in items.values())
+
+    return {'cart_count': SimpleLazyObject(count)}
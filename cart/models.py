@@ -1,31 +1,66 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from products.models import Product
 
 User = get_user_model()
 
+
+def totals(prefix=''):
+    """Aggregates of a cart's item count and price, over CartItem fields under prefix"""
+    return {
+        'items_count': Coalesce(Sum(f'{prefix}quantity'), 0),
+        'items_total': Coalesce(
+            Sum(F(f'{prefix}quantity') * F(f'{prefix}price')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+    }
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate each cart's items_count and items_total, summed in the database"""
+        return self.annotate(**totals('items__'))
+
+
 class Cart(models.Model):
     """Shopping cart model for logged-in users"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart for {self.user.username}"
 
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        if hasattr(self, 'items_count'):
+            # Annotated by CartQuerySet.with_totals()
+            return self.items_count
+        from .totals import get_totals
+        return get_totals(self.user_id)['items_count']
 
     @property
     def total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        if hasattr(self, 'items_total'):
+            # Annotated by CartQuerySet.with_totals()
+            return self.items_total
+        from .totals import get_totals
+        return get_totals(self.user_id)['items_total']
 
 class CartItem(models.Model):
     """Individual items in a shopping cart"""
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # Price when the product was added, revalidated at checkout by price_version
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_version = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,4 +71,4 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
 
     def get_total_price(self):
-        return self.quantity * self.product.price
+        return self.quantity * self.price
@@ -0,0 +1,62 @@
+from functools import partial
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from products.models import Product
+from . import totals
+from .models import Cart, CartItem
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    """Move the cart filled in before logging in into the user's stored cart"""
+    session_cart = request.session.get(settings.CART_SESSION_ID)
+    if not session_cart:
+        return
+    # Lines whose product has since been deleted are dropped
+    product_ids = list(Product.objects.filter(pk__in=session_cart.keys()).values_list(
+        'pk', flat=True
+    ))
+    cart, _ = Cart.objects.get_or_create(user=user)
+    stored = dict(CartItem.objects.filter(cart=cart, product_id__in=product_ids).values_list(
+        'product_id', 'quantity'
+    ))
+    # One upsert for every line: quantities add up, stored prices are kept
+    CartItem.objects.bulk_create(
+        [
+            CartItem(
+                cart=cart,
+                product_id=product_id,
+                quantity=stored.get(product_id, 0) + session_cart[str(product_id)]['quantity'],
+                price=session_cart[str(product_id)]['price'],
+                price_version=session_cart[str(product_id)].get('price_version', 0)
+            )
+            for product_id in product_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['cart', 'product'],
+        update_fields=['quantity', 'updated_at']
+    )
+    del request.session[settings.CART_SESSION_ID]
+    totals.invalidate(user.pk)
+
+# CartItem deletes aren't received: a post_delete receiver would stop
+# DatabaseCart's deletes from running as a single query, so it and the admin
+# invalidate, and items deleted with their product or cart are covered below
+@receiver(post_save, sender=CartItem)
+def invalidate_cart_totals(sender, instance, **kwargs):
+    """Drop the cached totals of the item's cart"""
+    totals.invalidate(instance.cart.user_id)
+
+@receiver(pre_delete, sender=Product)
+def invalidate_carts_with_product(sender, instance, **kwargs):
+    """Drop the cached totals of every cart losing the product's items"""
+    user_ids = list(Cart.objects.filter(items__product=instance).values_list('user_id', flat=True))
+    if user_ids:
+        transaction.on_commit(partial(totals.invalidate, *user_ids))
+
+@receiver(pre_delete, sender=Cart)
+def invalidate_deleted_cart(sender, instance, **kwargs):
+    """Drop the cached totals of a cart deleted, e.g. with its user"""
+    transaction.on_commit(partial(totals.invalidate, instance.user_id))
@@ -0,0 +1,33 @@
+"""
+Per-cart totals for logged-in users.
+
+The item count and price of a stored cart are summed in the database and
+cached by user, since a user has one cart; the cart badge and the checks
+on the cart's size read them without loading any rows. DatabaseCart drops
+the entry after every change it writes, and so do the cart signals (for
+saved items and for products, carts and users being deleted) and admin
+for changes made elsewhere.
+"""
+from django.core.cache import cache
+from .models import CartItem, totals
+
+# Kept short: a read racing a change can cache the totals from before it
+TOTALS_TIMEOUT = 60
+
+
+def totals_key(user_id):
+    return f'cart:totals:{user_id}'
+
+
+def get_totals(user_id):
+    """items_count and items_total of a user's stored cart"""
+    key = totals_key(user_id)
+    cart_totals = cache.get(key)
+    if cart_totals is None:
+        cart_totals = CartItem.objects.filter(cart__user_id=user_id).aggregate(**totals())
+        cache.set(key, cart_totals, TOTALS_TIMEOUT)
+    return cart_totals
+
+
+def invalidate(*user_ids):
+    cache.delete_many([totals_key(user_id) for user_id in user_ids])
@@ -1,13 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from products.models import Product
-from .cart import Cart
+from .cart import get_cart
 from .forms import CartAddProductForm
 
 @require_POST
 def cart_add(request, product_id):
     """Add a product to the cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     form = CartAddProductForm(request.POST)
     
@@ -23,14 +23,14 @@ def cart_add(request, product_id):
 @require_POST
 def cart_remove(request, product_id):
     """Remove a product from the cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     cart.remove(product)
     return redirect('cart:cart_detail')
 
 def cart_detail(request):
     """Display cart contents"""
-    cart = Cart(request)
+    cart = get_cart(request)
     for item in cart:
         item['update_quantity_form'] = CartAddProductForm(
             initial={
@@ -0,0 +1,111 @@
+"""
+Order placement in a fixed number of queries.
+
+The cart's products are loaded once, before the transaction, and checked
+for availability and price changes: a line whose product's price_version
+or price moved on since it was added is repriced, and all changed lines are
+reported together. The transaction then inserts the
+order, takes the stock for every line at once (see products.inventory)
+and bulk inserts the items and the first status entry, so a large cart
+takes the same queries, and holds the write lock about as long, as a
+cart of one.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from products import inventory
+from products.models import Product
+from .models import OrderItem, OrderStatusHistory
+
+
+class CheckoutError(Exception):
+    """The cart can't be ordered as it is; the message says why"""
+
+
+class PriceChanged(CheckoutError):
+    """Prices changed since the products were added to the cart"""
+
+    def __init__(self, changes):
+        # (product, price in the cart) for every changed line
+        self.changes = changes
+        super().__init__('Prices have changed for: ' + ', '.join(
+            f'{product.name} (was ${price}, now ${product.price})' for product, price in changes
+        ) + '.')
+
+
+def revalidate(cart):
+    """
+    Check every cart line against the catalog in one query, repricing lines
+    whose product's price changed since it was added.
+
+    Returns the (product, price, quantity) lines and the (product, old
+    price) pairs that changed. Raises CheckoutError when a product is gone.
+    """
+    quantities = cart.quantities()
+    products = Product.objects.filter(pk__in=quantities).only(
+        'pk', 'name', 'price', 'price_version', 'is_active', 'status'
+    ).in_bulk()
+    lines = []
+    stale = []
+    changes = []
+    unavailable = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None or not (product.is_active and product.status == 'active'):
+            unavailable.append(product_id)
+            continue
+        item = cart.cart[str(product_id)]
+        price = Decimal(item['price'])
+        # Carts saved before price versions have none and are checked too;
+        # the price itself is compared as well, whatever the version says
+        if item.get('price_version') != product.price_version or price != product.price:
+            stale.append(product)
+            if price != product.price:
+                changes.append((product, price))
+            price = product.price
+        lines.append((product, price, quantity))
+    if unavailable:
+        raise CheckoutError('Some products in your cart are no longer available.')
+    if stale:
+        cart.update_prices(stale)
+    return lines, changes
+
+
+def place_order(form, cart, user):
+    """
+    Create an order from a valid OrderCreateForm and the cart.
+
+    Raises CheckoutError, with nothing written, when the cart is empty, a
+    product is gone, its price changed (the cart is repriced) or stock runs
+    short.
+    """
+    lines, changes = revalidate(cart)
+    if not lines:
+        raise CheckoutError('Your cart is empty.')
+    if changes:
+        raise PriceChanged(changes)
+
+    order = form.save(commit=False)
+    order.user = user
+    order.total_amount = sum(price * quantity for product, price, quantity in lines)
+    try:
+        with transaction.atomic():
+            order.save()
+            inventory.checkout(
+                inventory.hold_key(user),
+                {product.pk: quantity for product, price, quantity in lines},
+                reference=str(order.order_id)
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, price=price, quantity=quantity)
+                for product, price, quantity in lines
+            ])
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='pending',
+                notes='Order created',
+                changed_by=user
+            )
+    except inventory.InsufficientStock as e:
+        raise CheckoutError(f'Not enough stock left for: {e}.') from e
+    return order
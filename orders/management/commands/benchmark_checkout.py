@@ -0,0 +1,86 @@
+import time
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from cart.cart import SessionCart
+from orders.checkout import place_order
+from orders.forms import OrderCreateForm
+from products.models import Product
+
+BILLING = {
+    'first_name': 'Bench', 'last_name': 'Mark', 'email': 'bench@example.com',
+    'phone': '555-0100', 'address': '1 Test Street', 'city': 'Testville',
+    'postal_code': '00000', 'country': 'Nowhere',
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the queries placing an order takes for growing cart sizes. '
+        'On SQLite, carts beyond about 100 lines add a query per extra batch '
+        'of bulk inserts, which Django caps at 999 parameters.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 100])
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                counts = self.benchmark(options['sizes'])
+                raise Rollback
+        except Rollback:
+            pass
+        if len(set(counts.values())) > 1:
+            raise CommandError(f'Query count depends on cart size: {counts}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Every order took {next(iter(counts.values()))} queries'
+        ))
+
+    def benchmark(self, sizes):
+        user = get_user_model().objects.create(username='benchmark-checkout', role='vendor')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Checkout product {n}',
+                slug=f'checkout-product-{n}',
+                sku=f'CHECKOUT{n}',
+                description='Checkout benchmark product',
+                price=10,
+                stock=10 * len(sizes),
+                is_orderable=True,
+                vendor=user,
+                status='active',
+            )
+            for n in range(max(sizes))
+        ])
+        products = list(Product.objects.filter(vendor=user).order_by('pk'))
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+
+        counts = {}
+        for size in sizes:
+            cart = SessionCart(SimpleNamespace(session=session_store()))
+            for product in products[:size]:
+                cart.add(product, quantity=2)
+            form = OrderCreateForm(BILLING, user=user)
+            if not form.is_valid():
+                raise CommandError(form.errors.as_text())
+
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                order = place_order(form, cart, user)
+            elapsed = (time.perf_counter() - started) * 1000
+            counts[size] = len(queries)
+            self.stdout.write(
+                f'{size:>4} lines: {len(queries)} queries, {elapsed:.1f} ms, '
+                f'{order.items.count()} items saved'
+            )
+        return counts
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.pagination import invalidate_counts
+from .models import Order
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_counts(sender, **kwargs):
+    """Drop cached order list counts when orders change"""
+    invalidate_counts(Order)
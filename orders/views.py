@@ -1,16 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db import transaction
-from cart.cart import Cart
-from .models import Order, OrderItem, OrderStatusHistory
+from cart.cart import get_cart
+from products import inventory
+from products.pagination import CachedCountPaginator
+from .checkout import CheckoutError, PriceChanged, place_order, revalidate
+from .models import Order
 from .forms import OrderCreateForm
 
 @login_required
 def order_create(request):
     """Create a new order from cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     
     if len(cart) == 0:
         messages.error(request, 'Your cart is empty.')
@@ -19,39 +20,36 @@ def order_create(request):
     if request.method == 'POST':
         form = OrderCreateForm(request.POST, user=request.user)
         if form.is_valid():
-            with transaction.atomic():
-                # Create order
-                order = form.save(commit=False)
-                order.user = request.user
-                order.total_amount = cart.get_total_price()
-                order.save()
-                
-                # Create order items
-                for item in cart:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item['product'],
-                        price=item['price'],
-                        quantity=item['quantity']
-                    )
-                
-                # Create initial status history
-                OrderStatusHistory.objects.create(
-                    order=order,
-                    status='pending',
-                    notes='Order created',
-                    changed_by=request.user
-                )
-                
-                # Clear the cart
-                cart.clear()
-                
-                messages.success(
-                    request,
-                    f'Your order {order.order_id} has been placed successfully!'
-                )
-                return redirect('orders:order_success', order_id=order.order_id)
+            try:
+                order = place_order(form, cart, request.user)
+            except CheckoutError as e:
+                messages.error(request, f'{e} Please review your cart.')
+                return redirect('cart:cart_detail')
+            
+            # Clear the cart
+            cart.clear()
+            
+            messages.success(
+                request,
+                f'Your order {order.order_id} has been placed successfully!'
+            )
+            return redirect('orders:order_success', order_id=order.order_id)
     else:
+        # Charge current prices, and say which changed, before the customer commits
+        try:
+            _, changes = revalidate(cart)
+        except CheckoutError as e:
+            messages.error(request, f'{e} Please review your cart.')
+            return redirect('cart:cart_detail')
+        if changes:
+            messages.warning(request, f'{PriceChanged(changes)} Your cart has been updated.')
+        
+        # Hold the stock while the customer fills in the form
+        try:
+            inventory.reserve(inventory.hold_key(request.user), cart.quantities())
+        except inventory.InsufficientStock as e:
+            messages.error(request, f'Not enough stock left for: {e}. Please review your cart.')
+            return redirect('cart:cart_detail')
         form = OrderCreateForm(user=request.user)
     
     return render(request, 'orders/order_create.html', {
@@ -71,7 +69,7 @@ def order_list(request):
     orders = Order.objects.filter(user=request.user)
     
     # Pagination
-    paginator = Paginator(orders, 10)
+    paginator = CachedCountPaginator(orders, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
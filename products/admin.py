@@ -1,11 +1,20 @@
+from functools import partial
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Brand, Product, ProductImage, ProductAttribute, ProductAttributeValue, Review
+from . import autocomplete, fragments, fuzzy, quick_view
+from .page_cache import invalidate_listings
+from .pagination import invalidate_counts
+from .models import (
+    Category, Brand, Product, ProductImage, ProductAttribute, ProductAttributeValue, Review,
+    StockMovement, StockReservation
+)
 
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
-    readonly_fields = ['image_preview']
+    readonly_fields = ['image_preview', 'rendition_status']
     
     def image_preview(self, obj):
         if obj.image:
@@ -39,7 +48,9 @@ class ProductAdmin(admin.ModelAdmin):
         'name', 'category', 'brand', 'price', 'stock', 
         'status', 'is_active', 'featured', 'created_at'
     ]
-    list_filter = ['status', 'is_active', 'featured', 'category', 'brand', 'created_at']
+    list_filter = [
+        'status', 'is_active', 'is_orderable', 'featured', 'category', 'brand', 'created_at'
+    ]
     search_fields = ['name', 'sku', 'description']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['status', 'is_active', 'featured']
@@ -69,19 +80,39 @@ class ProductAdmin(admin.ModelAdmin):
     actions = ['mark_as_active', 'mark_as_inactive', 'mark_as_featured']
     
     def mark_as_active(self, request, queryset):
-        updated = queryset.update(status='active', is_active=True)
+        # The selection, not its changelist filters, which no longer match once status changes
+        products = Product.objects.filter(pk__in=list(queryset.values_list('pk', flat=True)))
+        updated = products.update(status='active', is_active=True, updated_at=timezone.now())
+        products.update_orderable()
+        self.invalidate(products)
         self.message_user(request, f'{updated} products marked as active.')
     mark_as_active.short_description = "Mark selected products as active"
     
     def mark_as_inactive(self, request, queryset):
-        updated = queryset.update(status='inactive', is_active=False)
+        # The selection, not its changelist filters, which no longer match once status changes
+        products = Product.objects.filter(pk__in=list(queryset.values_list('pk', flat=True)))
+        updated = products.update(status='inactive', is_active=False, updated_at=timezone.now())
+        products.update_orderable()
+        self.invalidate(products)
         self.message_user(request, f'{updated} products marked as inactive.')
     mark_as_inactive.short_description = "Mark selected products as inactive"
     
     def mark_as_featured(self, request, queryset):
-        updated = queryset.update(featured=True)
+        updated = queryset.update(featured=True, updated_at=timezone.now())
+        self.invalidate(queryset)
         self.message_user(request, f'{updated} products marked as featured.')
     mark_as_featured.short_description = "Mark selected products as featured"
+    
+    def invalidate(self, products):
+        """Expire what the save signals would have, for products changed with update()"""
+        rows = products.values_list('pk', 'category__path', 'brand_id')
+        for product_id, category_path, brand_id in rows:
+            fragments.invalidate_product(product_id)
+            invalidate_listings(category_path or '', brand_id)
+            transaction.on_commit(partial(quick_view.build_quick_view, product_id))
+        invalidate_counts(Product)
+        transaction.on_commit(autocomplete.invalidate_products)
+        transaction.on_commit(fuzzy.invalidate_products)
 
 @admin.register(ProductAttribute)
 class ProductAttributeAdmin(admin.ModelAdmin):
@@ -94,4 +125,26 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'is_approved', 'is_verified_purchase', 'created_at']
     search_fields = ['product__name', 'user__username', 'title', 'comment']
     list_editable = ['is_approved']
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'kind', 'quantity', 'reservation', 'created_at']
+    list_filter = ['kind', 'created_at']
+    search_fields = ['product__name', 'product__sku']
+    raw_id_fields = ['product', 'reservation']
+    
+    # The ledger is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'key', 'quantity', 'from_stock', 'status', 'reference', 'expires_at']
+    list_filter = ['status', 'from_stock']
+    search_fields = ['key', 'reference', 'product__name']
+    raw_id_fields = ['product']
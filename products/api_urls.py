@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('product/<int:pk>/quick-view/', views.product_quick_view, name='product_quick_view'),
+    path('search/', views.search_suggestions, name='search_suggestions'),
+]
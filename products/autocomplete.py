@@ -0,0 +1,217 @@
+"""
+Search-as-you-type suggestions from an in-memory prefix index.
+
+Every word of a product's name, brand and category is a key in a sorted
+list; each key holds its products ordered by popularity (orders containing
+the product, then number of ratings). A prefix selects a contiguous range
+of keys with two bisections, and merging that range's posting lists lazily
+yields products most popular first, so the top N are found without
+touching the rest of the catalog or the database.
+
+Each process keeps its own index. Product saves bump the 'autocomplete'
+version and the next lookup folds in products updated since the last
+refresh, into a copy that then replaces the index, so concurrent searches
+never see it half updated; deletions, brand and category changes and new popularity figures
+bump 'autocomplete-rebuild' and the index is rebuilt.
+"""
+import bisect
+import heapq
+import re
+import threading
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_version, get_versions
+from .models import Product, ProductCoPurchase
+
+SUGGESTION_LIMIT = 8
+# Candidates examined per lookup before giving up on further matches
+MAX_SCAN = 2000
+# Re-read products updated this long before the last refresh, to catch
+# transactions that committed after it had started
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# Cache namespaces bumped whenever suggestions may change
+VERSION_NAMESPACES = ['autocomplete', 'autocomplete-rebuild']
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def words(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+def invalidate_products():
+    """Fold changed products into every process's index on next use"""
+    bump_version('autocomplete')
+
+
+def invalidate_index():
+    """Make every process rebuild its index on next use"""
+    bump_version('autocomplete-rebuild')
+
+
+def _rank(entry):
+    """Posting sort key: most popular first, then by id"""
+    orders, ratings = entry['popularity']
+    return (-orders, -ratings, entry['id'])
+
+
+class AutocompleteIndex:
+    """Sorted word keys mapping to popularity-ordered product postings"""
+
+    def __init__(self):
+        self.keys = []
+        self.postings = {}
+        self.entries = {}
+        # Words whose posting lists are shared with the index this was copied from
+        self._shared = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def copy(self):
+        """Copy to update while searches keep reading this index; posting lists are copied on write"""
+        index = AutocompleteIndex()
+        index.keys = list(self.keys)
+        index.postings = dict(self.postings)
+        index.entries = dict(self.entries)
+        index._shared = set(self.postings)
+        return index
+
+    def _posting(self, word):
+        """The posting list of word, safe to change"""
+        if word in self._shared:
+            self._shared.discard(word)
+            self.postings[word] = list(self.postings[word])
+        return self.postings[word]
+
+    def add(self, entry):
+        """Index a suggestion dict with id, name, price, image, words and popularity"""
+        self.remove(entry['id'])
+        rank = _rank(entry)
+        self.entries[entry['id']] = entry
+        for word in set(entry['words']):
+            if word in self.postings:
+                posting = self._posting(word)
+            else:
+                posting = self.postings[word] = []
+                bisect.insort(self.keys, word)
+            bisect.insort(posting, rank)
+
+    def remove(self, product_id):
+        entry = self.entries.pop(product_id, None)
+        if entry is None:
+            return
+        rank = _rank(entry)
+        for word in set(entry['words']):
+            posting = self._posting(word)
+            del posting[bisect.bisect_left(posting, rank)]
+            if not posting:
+                del self.postings[word]
+                del self.keys[bisect.bisect_left(self.keys, word)]
+
+    def _key_range(self, prefix):
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + '\uffff', low)
+        return self.keys[low:high]
+
+    def search(self, query, limit=SUGGESTION_LIMIT):
+        """Most popular products with a word starting with every word of query"""
+        tokens = words(query)
+        if not tokens:
+            return []
+
+        # Walk the longest (usually most selective) token, check the others
+        tokens.sort(key=len, reverse=True)
+        keys = self._key_range(tokens[0])
+        others = tokens[1:]
+
+        results = []
+        seen = set()
+        for scanned, (*_, product_id) in enumerate(
+            heapq.merge(*(self.postings[key] for key in keys))
+        ):
+            if len(results) >= limit or scanned >= MAX_SCAN:
+                break
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            entry = self.entries[product_id]
+            if all(any(word.startswith(token) for word in entry['words']) for token in others):
+                results.append(entry)
+        return results
+
+    def load(self, products):
+        """Add or replace products (a Product queryset), dropping inactive ones"""
+        products = products.for_listing()
+        products = list(products)
+        popularity = dict(ProductCoPurchase.objects.filter(
+            product_id__in=[product.pk for product in products],
+            other_id=F('product_id')
+        ).values_list('product_id', 'orders'))
+
+        for product in products:
+            if not (product.is_active and product.status == 'active'):
+                self.remove(product.pk)
+                continue
+            image = product.main_product_image
+            self.add({
+                'id': product.pk,
+                'name': product.name,
+                'price': str(product.price),
+                'image': image.rendition_url('card') if image else None,
+                'url': product.get_absolute_url(),
+                'words': tuple(
+                    words(product.name)
+                    + words(product.brand.name if product.brand else '')
+                    + words(product.category.name if product.category else '')
+                ),
+                'popularity': (popularity.get(product.pk, 0), product.rating_count),
+            })
+
+    @classmethod
+    def from_database(cls, chunk_size=2000):
+        index = cls()
+        product_ids = list(Product.objects.active().values_list('pk', flat=True))
+        for start in range(0, len(product_ids), chunk_size):
+            index.load(Product.objects.filter(pk__in=product_ids[start:start + chunk_size]))
+        return index
+
+
+_index = None
+_versions = None
+_refreshed_at = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Return this process's index, refreshed or rebuilt if the catalog changed"""
+    global _index, _versions, _refreshed_at
+    versions = get_versions(VERSION_NAMESPACES)
+    if _index is not None and versions == _versions:
+        return _index
+
+    with _lock:
+        if _index is not None and versions == _versions:
+            return _index
+        started = timezone.now()
+        if _index is None or versions['autocomplete-rebuild'] != _versions['autocomplete-rebuild']:
+            _index = AutocompleteIndex.from_database()
+        else:
+            index = _index.copy()
+            index.load(Product.objects.filter(updated_at__gte=_refreshed_at - REFRESH_OVERLAP))
+            _index = index
+        _versions = versions
+        _refreshed_at = started
+    return _index
+
+
+def suggest(query, limit=SUGGESTION_LIMIT):
+    """JSON-ready suggestions for a partially typed query"""
+    return [
+        {key: entry[key] for key in ('id', 'name', 'price', 'image', 'url')}
+        for entry in get_index().search(query, limit)
+    ]
@@ -0,0 +1,53 @@
+"""
+Versioned cache namespaces for catalog data.
+
+Cached entries embed the current version of the namespace they depend on
+in their key. Bumping the version orphans every entry at once, so writers
+never have to know which keys exist.
+"""
+import time
+
+from django.core.cache import cache
+
+KEY_PREFIX = 'catalog:version'
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}'
+
+
+def _initial_version():
+    # Seed from the clock so an evicted counter never reuses an old version
+    return int(time.time() * 1000)
+
+
+def get_version(namespace):
+    """Return the current version of a namespace"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate everything cached under a namespace"""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
+
+
+def get_versions(namespaces):
+    """Return {namespace: version} for several namespaces in one cache round trip"""
+    namespaces = list(dict.fromkeys(namespaces))
+    keys = {_version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial_version(), None)
+        found[key] = cache.get(key)
+    return {namespace: found[key] for key, namespace in keys.items()}
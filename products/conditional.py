@@ -0,0 +1,119 @@
+"""
+HTTP conditional GET support for catalog pages and endpoints.
+
+Views name the cache namespaces (see products.cache) whose versions change
+with anything they show; catalog pages use the 'catalog' namespace, bumped
+by every product, category and brand change, so working out whether a
+page changed costs one cache read and no queries. An ETag is derived from
+those versions, the query string and who is looking (pages show the
+visitor's cart count and review form), and a request whose If-None-Match
+still matches gets a 304 without the page being built. Versions carry no
+date, so no Last-Modified is sent.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from cart import totals as cart_totals
+
+from .cache import bump_version, get_versions
+
+# Bumped with every change to what catalog pages show, see products.fragments
+CATALOG_NAMESPACE = 'catalog'
+
+
+def invalidate_catalog():
+    """Change the ETag of every catalog page"""
+    bump_version(CATALOG_NAMESPACE)
+
+
+def _viewer(request):
+    """What about the visitor changes the page, or None if nothing does"""
+    if request.user.is_authenticated:
+        # Logged-in users' carts are stored, see cart.cart.DatabaseCart
+        cart = cart_totals.get_totals(request.user.pk)
+        return (request.user.pk, cart['items_count'], str(cart['items_total']))
+    cart = request.session.get(settings.CART_SESSION_ID) or {}
+    if not cart:
+        return None
+    quantities = sorted((product_id, item['quantity']) for product_id, item in cart.items())
+    return (None, quantities)
+
+
+def etag(request, namespaces, extra=()):
+    """ETag for a response showing namespaces at their current versions, or None if it can't be validated"""
+    if get_messages(request):
+        return None
+    versions = sorted(get_versions(namespaces).items())
+    parts = (versions, tuple(extra), sorted(request.GET.lists()), _viewer(request))
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def conditional_response(request, namespaces, extra=()):
+    """
+    Return (response, etag).
+
+    response is a 304 (or 412) when the client's copy is still current,
+    otherwise None and the caller builds the page and calls set_etag().
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None, None
+    current = etag(request, namespaces, extra)
+    if current is None:
+        return None, None
+    return get_conditional_response(request, etag=current), current
+
+
+def set_etag(response, etag):
+    if etag and response.status_code == 200 and not response.has_header('ETag'):
+        response['ETag'] = etag
+    return response
+
+
+def content_etag(request, response):
+    """Tag a response with a hash of its content, answering 304 when the client already has it"""
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    response['ETag'] = quote_etag(hashlib.md5(response.content).hexdigest())
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def condition_on_versions(get_namespaces):
+    """View decorator answering with 304 while get_namespaces(request, *args, **kwargs) keep their versions"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            not_modified, current = conditional_response(
+                request, get_namespaces(request, *args, **kwargs)
+            )
+            if not_modified is not None:
+                return not_modified
+            return set_etag(view(request, *args, **kwargs), current)
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    """Answer GETs with 304 Not Modified before rendering when the client is up to date"""
+    version_namespaces = [CATALOG_NAMESPACE]
+
+    def get_version_namespaces(self):
+        """Cache namespaces whose versions change with anything the page shows"""
+        return self.version_namespaces
+
+    def get_etag_extra(self):
+        """Extra values that change the page without bumping a version"""
+        return ()
+
+    def dispatch(self, request, *args, **kwargs):
+        not_modified, current = conditional_response(
+            request, self.get_version_namespaces(), self.get_etag_extra()
+        )
+        if not_modified is not None:
+            return not_modified
+        response = super().dispatch(request, *args, **kwargs)
+        return set_etag(response, current)
@@ -0,0 +1,29 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_version
+from .models import Brand, Category
+
+NAVIGATION_TIMEOUT = 60 * 60 * 24
+
+
+def get_navigation():
+    """Active category tree and brands for the site navigation, cached per version"""
+    key = f"catalog:navigation:{get_version('navigation')}"
+    navigation = cache.get(key)
+    if navigation is None:
+        navigation = {
+            'categories': Category.objects.filter(is_active=True).as_tree(),
+            'brands': list(Brand.objects.filter(is_active=True).order_by('name')),
+        }
+        cache.set(key, navigation, NAVIGATION_TIMEOUT)
+    return navigation
+
+
+def navigation(request):
+    """Navigation categories and brands, loaded only if a template uses them"""
+    navigation = SimpleLazyObject(get_navigation)
+    return {
+        'nav_categories': SimpleLazyObject(lambda: navigation['categories']),
+        'nav_brands': SimpleLazyObject(lambda: navigation['brands']),
+    }
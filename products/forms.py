@@ -117,6 +117,12 @@ class ProductSearchForm(forms.Form):
         required=False,
         widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
     )
+    fuzzy = forms.BooleanField(
+        required=False,
+        label='Typo tolerant',
+        help_text='Also match misspelled product, brand and category names',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
     
     SORT_CHOICES = [
         ('name', 'Name A-Z'),
@@ -125,6 +131,7 @@ class ProductSearchForm(forms.Form):
         ('-price', 'Price High to Low'),
         ('-created_at', 'Newest First'),
         ('created_at', 'Oldest First'),
+        ('-rating_average', 'Top Rated'),
     ]
     
     sort_by = forms.ChoiceField(
@@ -173,10 +180,10 @@ class CategoryForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Exclude self from parent choices when editing
+        # Exclude self and its subcategories from parent choices when editing
         if self.instance and self.instance.pk:
             self.fields['parent'].queryset = Category.objects.exclude(
-                pk=self.instance.pk
+                self.instance.subtree_q()
             )
 
 
@@ -0,0 +1,106 @@
+"""
+Versioned caching of rendered catalog fragments.
+
+Every fragment key embeds the versions of the objects it shows: a product
+card depends on its product, category and brand; the featured strip on
+'featured'; the filter sidebar on 'navigation'. Signals bump those versions
+when the objects change, so a stale price is never served and unchanged
+fragments stay cached.
+
+Fragments are rendered with CSRF_PLACEHOLDER in place of the per-user CSRF
+token, which is swapped in after every cache read.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.template.backends.utils import csrf_input
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import bump_version, get_versions
+from .conditional import invalidate_catalog
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+CSRF_PLACEHOLDER = '<!--csrf-token-->'
+
+
+def product_namespaces(product):
+    """Version namespaces a rendered product depends on"""
+    return [
+        f'product:{product.pk}',
+        f'category:{product.category_id}',
+        f'brand:{product.brand_id}',
+    ]
+
+
+def fragment_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'catalog:fragment:{name}:{digest}'
+
+
+def with_csrf(html, request):
+    """Put the request's CSRF token into a cached fragment"""
+    if request is None:
+        # Nested in another fragment, which fills the token in
+        return mark_safe(html)
+    return mark_safe(html.replace(CSRF_PLACEHOLDER, csrf_input(request)))
+
+
+def render_fragment(template_name, context):
+    return render_to_string(template_name, {**context, 'csrf_input': mark_safe(CSRF_PLACEHOLDER)})
+
+
+def render_products(products, template_name, request=None):
+    """Render one template per product, reusing every card cached at its current versions"""
+    products = list(products)
+    versions = get_versions(
+        namespace for product in products for namespace in product_namespaces(product)
+    )
+    keys = [
+        fragment_key(
+            template_name, product.pk,
+            *(versions[namespace] for namespace in product_namespaces(product))
+        )
+        for product in products
+    ]
+    cached = cache.get_many(keys)
+
+    rendered = {}
+    for product, key in zip(products, keys):
+        if key not in cached:
+            rendered[key] = render_fragment(template_name, {'product': product})
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    html = ''.join(cached.get(key) or rendered[key] for key in keys)
+    return with_csrf(html, request)
+
+
+def render_versioned(template_name, namespaces, parts, get_context, request=None):
+    """Render template_name once per version of namespaces; get_context is only called on a miss"""
+    versions = get_versions(namespaces)
+    key = fragment_key(template_name, *parts, *(versions[namespace] for namespace in namespaces))
+    html = cache.get(key)
+    if html is None:
+        html = render_fragment(template_name, get_context())
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    return with_csrf(html, request)
+
+
+def invalidate_product(product_id):
+    bump_version(f'product:{product_id}')
+    bump_version('featured')
+    transaction.on_commit(invalidate_catalog)
+
+
+def invalidate_category(category_id):
+    bump_version(f'category:{category_id}')
+    bump_version('featured')
+    transaction.on_commit(invalidate_catalog)
+
+
+def invalidate_brand(brand_id):
+    bump_version(f'brand:{brand_id}')
+    bump_version('featured')
+    transaction.on_commit(invalidate_catalog)
@@ -0,0 +1,350 @@
+"""
+Typo-tolerant catalog search backed by an in-memory trigram index.
+
+Product, brand and category names are broken into padded character
+trigrams (the same scheme as PostgreSQL's pg_trgm). A lookup only walks
+the posting lists of the query's rarest trigrams, and product names are
+matched through their vocabulary of words, so the cost of a query grows
+with the number of matching products rather than the size of the catalog.
+
+Each process keeps its own index. Product saves bump the 'fuzzy' version
+and the next lookup folds in products updated since the last refresh, into
+a copy that then replaces the index; deletions and brand or category
+changes bump 'fuzzy-rebuild' and the index is rebuilt.
+"""
+import heapq
+import math
+import re
+import threading
+from array import array
+from datetime import timedelta
+
+from django.db.models import Case, FloatField, Q, Value, When
+from django.utils import timezone
+
+from .cache import bump_version, get_versions
+from .models import Brand, Category, Product
+
+SIMILARITY_THRESHOLD = 0.3
+MATCH_LIMIT = 200
+# Vocabulary words considered as corrections for each query word
+WORD_CANDIDATES = 5
+# Re-read products updated this long before the last refresh, to catch
+# transactions that committed after it had started
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+VERSION_NAMESPACES = ['fuzzy', 'fuzzy-rebuild']
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def trigrams(text):
+    """Return the set of padded trigrams for text"""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def invalidate_products():
+    """Fold changed products into every process's index on next use"""
+    bump_version('fuzzy')
+
+
+def invalidate_index():
+    """Make every process rebuild its index on next use"""
+    bump_version('fuzzy-rebuild')
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the terms containing them"""
+
+    def __init__(self):
+        self.terms = []
+        self.sizes = array('I')
+        self.refs = []
+        self.postings = {}
+        self._term_ids = {}
+        # Trigrams whose posting arrays are shared with the index this was copied from
+        self._shared = set()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def copy(self):
+        """Copy to add to while searches keep reading this index; postings are copied on write"""
+        index = TrigramIndex()
+        index.terms = list(self.terms)
+        index.sizes = array('I', self.sizes)
+        index.refs = [list(refs) for refs in self.refs]
+        index.postings = dict(self.postings)
+        index._term_ids = dict(self._term_ids)
+        index._shared = set(self.postings)
+        return index
+
+    def add(self, text, ref=None):
+        """Index text, remembering ref (e.g. a primary key) against it"""
+        key = text.lower()
+        term_id = self._term_ids.get(key)
+        if term_id is None:
+            grams = trigrams(text)
+            if not grams:
+                return
+            term_id = self._term_ids[key] = len(self.terms)
+            self.terms.append(text)
+            self.sizes.append(len(grams))
+            self.refs.append([])
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array('I')
+                elif gram in self._shared:
+                    self._shared.discard(gram)
+                    posting = self.postings[gram] = array('I', posting)
+                posting.append(term_id)
+        if ref is not None:
+            self.refs[term_id].append(ref)
+
+    def search(self, text, threshold=SIMILARITY_THRESHOLD, limit=None):
+        """
+        Return (term, similarity, refs) tuples for terms similar to text.
+
+        Similarity is the share of the query's trigrams found in the term,
+        so a short query can match inside a longer name. Results are sorted
+        by similarity, ties broken by the closer overall length.
+        """
+        query = trigrams(text)
+        if not query:
+            return []
+
+        # A term scoring >= threshold must contain at least min_overlap query
+        # trigrams, hence at least one of the (n - min_overlap + 1) rarest.
+        min_overlap = max(1, math.ceil(threshold * len(query)))
+        ordered = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+        prefix = ordered[:len(ordered) - min_overlap + 1]
+
+        candidates = set()
+        for gram in prefix:
+            candidates.update(self.postings.get(gram, ()))
+
+        # Verify candidates directly instead of walking the common trigrams
+        results = []
+        for term_id in candidates:
+            overlap = len(query & trigrams(self.terms[term_id]))
+            if overlap < min_overlap:
+                continue
+            similarity = overlap / len(query)
+            jaccard = overlap / (len(query) + self.sizes[term_id] - overlap)
+            results.append((similarity, jaccard, term_id))
+        results.sort(reverse=True)
+        if limit is not None:
+            results = results[:limit]
+
+        return [
+            (self.terms[term_id], similarity, self.refs[term_id])
+            for similarity, jaccard, term_id in results
+        ]
+
+
+class CatalogFuzzyIndex:
+    """
+    Trigram indexes over catalog names.
+
+    Products are matched word by word: each query word is corrected against
+    the (small) vocabulary of name words, and the products containing a
+    close match for every query word are intersected. Brands and categories
+    are few, so their whole names are indexed directly.
+
+    Words a renamed product no longer uses stay in the vocabulary, without
+    products, until the next rebuild.
+    """
+
+    def __init__(self):
+        self.words = TrigramIndex()
+        self.word_products = {}
+        self.product_words = {}
+        self.brands = TrigramIndex()
+        self.categories = TrigramIndex()
+        # Words whose product arrays are shared with the index this was copied from
+        self._shared = set()
+
+    def copy(self):
+        """Copy to update while searches keep reading this index"""
+        index = CatalogFuzzyIndex()
+        index.words = self.words.copy()
+        index.word_products = dict(self.word_products)
+        index.product_words = dict(self.product_words)
+        index.brands = self.brands
+        index.categories = self.categories
+        index._shared = set(self.word_products)
+        return index
+
+    def _products(self, word):
+        """The product array of word, safe to change"""
+        if word in self._shared:
+            self._shared.discard(word)
+            self.word_products[word] = array('Q', self.word_products[word])
+        return self.word_products[word]
+
+    def add_product(self, pk, name):
+        self.remove_product(pk)
+        words = self.product_words[pk] = tuple(set(_WORD_RE.findall(name.lower())))
+        for word in words:
+            self.words.add(word)
+            if word in self.word_products:
+                self._products(word).append(pk)
+            else:
+                self.word_products[word] = array('Q', [pk])
+
+    def remove_product(self, pk):
+        for word in self.product_words.pop(pk, ()):
+            posting = self._products(word)
+            posting.remove(pk)
+            if not posting:
+                del self.word_products[word]
+
+    def load_products(self, products):
+        """Add or replace products (a Product queryset), dropping inactive ones"""
+        rows = products.values_list('id', 'name', 'is_active', 'status')
+        for pk, name, is_active, status in rows.iterator(chunk_size=5000):
+            if is_active and status == 'active':
+                self.add_product(pk, name)
+            else:
+                self.remove_product(pk)
+
+    def add_brand(self, pk, name):
+        self.brands.add(name, pk)
+        self._add_words(name)
+
+    def add_category(self, pk, name):
+        self.categories.add(name, pk)
+        self._add_words(name)
+
+    def _add_words(self, name):
+        for word in _WORD_RE.findall(name.lower()):
+            self.words.add(word)
+
+    @classmethod
+    def from_database(cls):
+        index = cls()
+        products = Product.objects.active()
+        for pk, name in products.values_list('id', 'name').iterator(chunk_size=5000):
+            index.add_product(pk, name)
+        for pk, name in Brand.objects.filter(is_active=True).values_list('id', 'name'):
+            index.add_brand(pk, name)
+        for pk, name in Category.objects.filter(is_active=True).values_list('id', 'name'):
+            index.add_category(pk, name)
+        return index
+
+    def match_products(self, query, threshold=SIMILARITY_THRESHOLD, limit=MATCH_LIMIT):
+        """Return {pk: similarity} for products matching every query word"""
+        per_word = []
+        for word in set(_WORD_RE.findall(query.lower())):
+            scores = {}
+            for term, similarity, refs in self.words.search(word, threshold, WORD_CANDIDATES):
+                for pk in self.word_products.get(term, ()):
+                    if similarity > scores.get(pk, 0):
+                        scores[pk] = similarity
+            if not scores:
+                return {}
+            per_word.append(scores)
+        if not per_word:
+            return {}
+
+        per_word.sort(key=len)
+        smallest, others = per_word[0], per_word[1:]
+        matches = {}
+        for pk, similarity in smallest.items():
+            total = similarity
+            for scores in others:
+                score = scores.get(pk)
+                if score is None:
+                    break
+                total += score
+            else:
+                matches[pk] = total / len(per_word)
+        best = heapq.nlargest(limit, matches.items(), key=lambda item: item[1])
+        return dict(best)
+
+    def match(self, query, threshold=SIMILARITY_THRESHOLD, limit=MATCH_LIMIT):
+        """Return {pk: similarity} dicts for products, brands and categories"""
+        matches = {'products': self.match_products(query, threshold, limit)}
+        for kind, index in (('brands', self.brands), ('categories', self.categories)):
+            matches[kind] = {
+                ref: similarity
+                for term, similarity, refs in index.search(query, threshold, limit)
+                for ref in refs
+            }
+        return matches
+
+    def suggest(self, query, threshold=SIMILARITY_THRESHOLD):
+        """Return a corrected query ("did you mean"), or None"""
+        words = _WORD_RE.findall(query.lower())
+        corrected = []
+        for word in words:
+            matches = self.words.search(word, threshold, limit=1)
+            corrected.append(matches[0][0] if matches else word)
+        if corrected != words:
+            return ' '.join(corrected)
+        return None
+
+
+_index = None
+_versions = None
+_refreshed_at = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Return this process's index, refreshed or rebuilt if the catalog changed"""
+    global _index, _versions, _refreshed_at
+    versions = get_versions(VERSION_NAMESPACES)
+    if _index is not None and versions == _versions:
+        return _index
+
+    with _lock:
+        if _index is not None and versions == _versions:
+            return _index
+        started = timezone.now()
+        if _index is None or versions['fuzzy-rebuild'] != _versions['fuzzy-rebuild']:
+            _index = CatalogFuzzyIndex.from_database()
+        else:
+            index = _index.copy()
+            index.load_products(Product.objects.filter(updated_at__gte=_refreshed_at - REFRESH_OVERLAP))
+            _index = index
+        _versions = versions
+        _refreshed_at = started
+    return _index
+
+
+def fuzzy_search_products(queryset, query):
+    """
+    Restrict a Product queryset to approximate name, brand or category matches.
+
+    Matches are annotated with search_rank, the best similarity found.
+    """
+    matches = get_index().match(query)
+    if not any(matches.values()):
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    whens = [
+        When(pk=pk, then=Value(score)) for pk, score in matches['products'].items()
+    ] + [
+        When(brand_id=pk, then=Value(score)) for pk, score in matches['brands'].items()
+    ] + [
+        When(category_id=pk, then=Value(score)) for pk, score in matches['categories'].items()
+    ]
+    return queryset.filter(
+        Q(pk__in=list(matches['products'])) |
+        Q(brand_id__in=list(matches['brands'])) |
+        Q(category_id__in=list(matches['categories']))
+    ).annotate(
+        search_rank=Case(*whens, default=Value(0.0), output_field=FloatField())
+    )
+
+
+def suggest_query(query):
+    """Return a "did you mean" suggestion for query, or None"""
+    return get_index().suggest(query)
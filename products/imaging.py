@@ -0,0 +1,124 @@
+"""
+Memory-bounded image decoding and resizing.
+
+Sources are never fully decoded when a smaller result is wanted: JPEGs are
+decoded straight at a reduced scale (1/2, 1/4 or 1/8) through draft mode
+and other formats are shrunk with Image.reduce() before the final
+high-quality resample. EXIF orientation is applied to the pixels, bulky
+metadata is dropped, and sources over MAX_SOURCE_PIXELS are refused before
+decoding.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from PIL.JpegImagePlugin import JpegImageFile
+
+# Refuse sources above this many pixels (about a 100 megapixel photo)
+MAX_SOURCE_PIXELS = 100_000_000
+# EXIF blocks larger than this (e.g. embedded previews) are not copied
+MAX_EXIF_BYTES = 16 * 1024
+# Non-JPEG sources are box-reduced to no less than this many times the target
+REDUCING_GAP = 2
+
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+}
+
+EXIF_ORIENTATION = 0x0112
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def open_image(fp, max_pixels=MAX_SOURCE_PIXELS):
+    """Open an image lazily, refusing it if it has too many pixels"""
+    img = Image.open(fp)
+    if img.width * img.height > max_pixels:
+        raise ImageTooLarge(
+            f'{img.width}x{img.height} image exceeds the {max_pixels:,} pixel limit'
+        )
+    return img
+
+
+def load_downscaled(fp, max_side, max_pixels=MAX_SOURCE_PIXELS):
+    """
+    Decode fp close to, but not below, max_side on its longest side.
+
+    Returns (image, source_format) with EXIF orientation already applied.
+    """
+    img = open_image(fp, max_pixels)
+    source_format = img.format or 'JPEG'
+
+    # Includes MPO photos (e.g. from phones), JPEGs with extra frames that
+    # are decoded and re-encoded as plain JPEGs
+    if isinstance(img, JpegImageFile):
+        source_format = 'JPEG'
+        # The decoder picks the smallest scale still at least max_side
+        # and only ever produces that scaled-down image
+        img.draft(img.mode, (max_side, max_side))
+    img.load()
+
+    factor = max(img.size) // (max_side * REDUCING_GAP)
+    if factor >= 2:
+        if img.mode in ('1', 'P'):
+            img = img.convert('RGBA')
+        img = img.reduce(factor)
+
+    ImageOps.exif_transpose(img, in_place=True)
+    return img, source_format
+
+
+def fit(img, max_side):
+    """Return a copy of img resized to fit within max_side"""
+    resized = img.copy()
+    resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    return resized
+
+
+def _metadata(img):
+    """Save options carrying over the ICC profile and a small EXIF block"""
+    options = {}
+    icc_profile = img.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    exif = img.getexif()
+    if exif:
+        # Orientation has already been applied to the pixels
+        exif.pop(EXIF_ORIENTATION, None)
+        data = exif.tobytes()
+        if len(data) <= MAX_EXIF_BYTES:
+            options['exif'] = data
+    return options
+
+
+def encode(img, image_format):
+    """Encode img as image_format bytes, converting modes the format can't hold"""
+    if image_format in ('JPEG', 'WEBP') and img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+    if image_format == 'JPEG' and img.mode == 'RGBA':
+        img = img.convert('RGB')
+    buffer = BytesIO()
+    img.save(
+        buffer,
+        format=image_format,
+        **SAVE_OPTIONS.get(image_format, {}),
+        **_metadata(img)
+    )
+    return buffer.getvalue()
+
+
+def shrink_file(path, max_side, max_pixels=MAX_SOURCE_PIXELS):
+    """Shrink the image file at path in place to fit within max_side, if larger"""
+    with open(path, 'rb') as source:
+        img = open_image(source, max_pixels)
+        if max(img.size) <= max_side:
+            return False
+        source.seek(0)
+        img, source_format = load_downscaled(source, max_side, max_pixels)
+        resized = fit(img, max_side)
+    with open(path, 'wb') as target:
+        target.write(encode(resized, source_format))
+    return True
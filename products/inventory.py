@@ -0,0 +1,209 @@
+"""
+Stock reservation for checkout.
+
+All lines of a checkout are reserved in one transaction with a fixed
+number of queries, whatever the size of the cart. The products are
+locked in id order (SELECT ... FOR UPDATE), so concurrent checkouts queue
+briefly on the products they share instead of deadlocking. Stock is then
+taken with one conditional UPDATE, 'stock = stock - n WHERE stock >= n'
+with each line's n from a CASE, so stock can't be oversold even where
+rows can't be locked. A line that can't be filled rolls the whole
+reservation back.
+
+Reserved stock is held for HOLD_TTL while the customer checks out, then
+either becomes an order or goes back to stock via release_expired().
+Every change to stock is recorded as a StockMovement.
+"""
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import fragments
+from .models import Product, StockMovement, StockReservation
+from .pagination import invalidate_counts
+from .quick_view import quick_view_key
+
+HOLD_TTL = timedelta(minutes=15)
+
+
+class InsufficientStock(Exception):
+    """Some checkout lines can't be filled; products lists them"""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(', '.join(product.name for product in products))
+
+
+def hold_key(user):
+    """Reservation key of a customer's checkout"""
+    return f'user:{user.pk}'
+
+
+def _invalidate(product_ids):
+    cache.delete_many([quick_view_key(product_id) for product_id in product_ids])
+    # Stock and is_orderable filter listings, e.g. in_stock, so their counts change
+    invalidate_counts(Product)
+    for product_id in product_ids:
+        fragments.invalidate_product(product_id)
+
+
+def _sync_orderable(product_ids):
+    """Date the stock change, recompute is_orderable and drop what caches show the stock"""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    # Pages show the stock itself, so their ETags and cached copies go too
+    Product.objects.filter(pk__in=product_ids).update_orderable(updated_at=timezone.now())
+    transaction.on_commit(lambda: _invalidate(product_ids))
+
+
+def _per_product(quantities):
+    """CASE expression for each product's quantity in quantities, a map of product id to quantity"""
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField()
+    )
+
+
+def _take(quantities):
+    """Take each quantity from stock in one UPDATE if every product has that much; whether it was taken"""
+    amount = _per_product(quantities)
+    return Product.objects.filter(pk__in=quantities, stock__gte=amount).update(
+        stock=F('stock') - amount
+    ) == len(quantities)
+
+
+def _release(reservations, now):
+    """Put the stock of the held reservations in a queryset back; returns how many were released"""
+    # Claim the holds with one UPDATE, tagged so they can be read back: a
+    # hold released concurrently is claimed only once, and the transaction
+    # writes before it reads (on SQLite that takes the write lock up front
+    # instead of failing to upgrade a read lock under contention)
+    token = f'released:{uuid.uuid4().hex}'
+    if not reservations.filter(status='held').update(
+        status='released', reference=token, updated_at=now
+    ):
+        return 0
+    released = list(StockReservation.objects.filter(status='released', reference=token))
+    restocked = {}
+    for reservation in released:
+        if reservation.from_stock:
+            restocked[reservation.product_id] = (
+                restocked.get(reservation.product_id, 0) + reservation.quantity
+            )
+    if restocked:
+        Product.objects.filter(pk__in=restocked).update(
+            stock=F('stock') + _per_product(restocked)
+        )
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=reservation.product_id,
+            quantity=reservation.quantity,
+            kind='release',
+            reservation=reservation
+        )
+        for reservation in released if reservation.from_stock
+    ])
+    _sync_orderable(restocked)
+    return len(released)
+
+
+def release_expired(now=None):
+    """Put the stock of expired holds back; returns how many were released"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        return _release(StockReservation.objects.filter(expires_at__lte=now), now)
+
+
+def release(key):
+    """Put the stock held by a checkout back"""
+    with transaction.atomic():
+        return _release(StockReservation.objects.filter(key=key), timezone.now())
+
+
+@transaction.atomic
+def reserve(key, quantities, ttl=HOLD_TTL):
+    """
+    Hold stock for every line of a checkout for ttl, replacing the key's
+    earlier holds; quantities maps product ids to quantities.
+
+    Raises InsufficientStock, holding nothing, when any product is not on
+    sale or lacks the stock and doesn't allow backorders. Returns the
+    StockReservations.
+    """
+    return _reserve(key, quantities, ttl)
+
+
+def _reserve(key, quantities, ttl):
+    now = timezone.now()
+    # Also the transaction's first write, see _release()
+    _release(StockReservation.objects.filter(expires_at__lte=now), now)
+
+    held = list(StockReservation.objects.filter(key=key, status='held'))
+    if held and {hold.product_id: hold.quantity for hold in held} == quantities and all(
+        reservation.expires_at > now for reservation in held
+    ):
+        # Same cart as last time: keep the holds unless one was just released
+        extended = StockReservation.objects.filter(
+            pk__in=[reservation.pk for reservation in held], status='held'
+        ).update(expires_at=now + ttl, updated_at=now)
+        if extended == len(held):
+            return held
+    if held:
+        _release(StockReservation.objects.filter(key=key), now)
+
+    products = list(Product.objects.select_for_update().filter(pk__in=quantities).only(
+        'pk', 'name', 'stock', 'is_active', 'status', 'track_inventory', 'allow_backorders'
+    ).order_by('pk'))
+    reservations = []
+    unavailable = []
+    taken = {}
+    for product in products:
+        quantity = quantities[product.pk]
+        if not product.can_be_ordered(quantity):
+            unavailable.append(product)
+            continue
+        # Backordered and untracked products are held without taking stock
+        from_stock = product.track_inventory and product.stock >= quantity
+        if from_stock:
+            taken[product.pk] = quantity
+        reservations.append(StockReservation(
+            key=key,
+            product=product,
+            quantity=quantity,
+            from_stock=from_stock,
+            expires_at=now + ttl
+        ))
+    if not unavailable and taken and not _take(taken):
+        # Only when stock changed under us, where rows couldn't be locked
+        unavailable = [product for product in products if product.pk in taken]
+    if unavailable:
+        # Rolls back any stock already taken
+        raise InsufficientStock(unavailable)
+
+    StockReservation.objects.bulk_create(reservations)
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product_id=reservation.product_id,
+            quantity=-reservation.quantity,
+            kind='hold',
+            reservation=reservation
+        )
+        for reservation in reservations if reservation.from_stock
+    ])
+    _sync_orderable(reservation.product_id for reservation in reservations if reservation.from_stock)
+    return reservations
+
+
+@transaction.atomic
+def checkout(key, quantities, reference):
+    """Reserve a checkout's lines (see reserve()) and mark the holds as ordered under reference"""
+    reservations = _reserve(key, quantities, HOLD_TTL)
+    StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in reservations], status='held'
+    ).update(status='ordered', reference=reference, updated_at=timezone.now())
+    return reservations
@@ -0,0 +1,106 @@
+import random
+import resource
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from products.fuzzy import CatalogFuzzyIndex, SIMILARITY_THRESHOLD, trigrams
+
+BRANDS = [
+    'Samsung', 'Apple', 'Sony', 'Lenovo', 'Philips', 'Panasonic', 'Adidas',
+    'Nike', 'Puma', 'Logitech', 'Canon', 'Nikon', 'Xiaomi', 'Bosch', 'Dyson',
+]
+NOUNS = [
+    'Headphones', 'Keyboard', 'Monitor', 'Sneakers', 'Backpack', 'Camera',
+    'Blender', 'Vacuum', 'Smartphone', 'Tablet', 'Speaker', 'Charger',
+    'Jacket', 'Watch', 'Router', 'Printer', 'Microphone', 'Lamp',
+]
+ADJECTIVES = [
+    'Wireless', 'Portable', 'Ultra', 'Classic', 'Compact', 'Pro', 'Smart',
+    'Premium', 'Digital', 'Ergonomic', 'Waterproof', 'Gaming', 'Mini',
+]
+
+
+def misspell(word, rng):
+    """Apply one random edit (swap, drop, replace or insert) to word"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.choice(['swap', 'drop', 'replace', 'insert'])
+    if edit == 'swap':
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if edit == 'drop':
+        return word[:i] + word[i + 1:]
+    letter = rng.choice(string.ascii_lowercase)
+    if edit == 'replace':
+        return word[:i] + letter + word[i + 1:]
+    return word[:i] + letter + word[i:]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the trigram index against a linear scan on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--scan-queries', type=int, default=5,
+                            help='Queries to time with a linear scan for comparison')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        total = options['products']
+
+        self.stdout.write(f'Building index over {total:,} synthetic products...')
+        started = time.perf_counter()
+        index = CatalogFuzzyIndex()
+        names = []
+        for pk in range(1, total + 1):
+            name = (
+                f'{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} '
+                f'{rng.choice(NOUNS)} {rng.randrange(100, 10000)}'
+            )
+            names.append(name)
+            index.add_product(pk, name)
+        for pk, brand in enumerate(BRANDS, start=1):
+            index.add_brand(pk, brand)
+        build_seconds = time.perf_counter() - started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        queries = [
+            ' '.join(misspell(word, rng) for word in rng.choice(names).split()[:2])
+            for _ in range(options['queries'])
+        ]
+
+        timings = []
+        hits = 0
+        for query in queries:
+            started = time.perf_counter()
+            matches = index.match(query)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += bool(matches['products'])
+
+        scan_timings = []
+        for query in queries[:options['scan_queries']]:
+            started = time.perf_counter()
+            query_grams = trigrams(query)
+            minimum = SIMILARITY_THRESHOLD * len(query_grams)
+            sum(1 for name in names if len(query_grams & trigrams(name)) >= minimum)
+            scan_timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        self.stdout.write(f'Vocabulary: {len(index.words):,} distinct words')
+        self.stdout.write(f'Build time: {build_seconds:.1f} s, peak RSS: {peak_mb:.0f} MB')
+        self.stdout.write(
+            f'Fuzzy lookups: p50 {statistics.median(timings):.2f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms, '
+            f'{hits}/{len(queries)} misspelled queries matched'
+        )
+        if scan_timings:
+            self.stdout.write(
+                f'Linear scan: mean {statistics.mean(scan_timings):.0f} ms '
+                f'over {len(scan_timings)} queries'
+            )
+        sample = queries[0]
+        self.stdout.write(f'Did you mean for "{sample}": {index.suggest(sample)}')
@@ -0,0 +1,77 @@
+import multiprocessing
+import resource
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from products import imaging
+from products.renditions import RENDITION_SIZES
+
+
+def synthetic_photo(width, height):
+    """JPEG bytes of a noisy width x height photo"""
+    bands = [
+        Image.effect_noise((width // 8, height // 8), sigma).resize((width, height))
+        for sigma in (40, 60, 80)
+    ]
+    buffer = BytesIO()
+    Image.merge('RGB', bands).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def full_decode(data):
+    """Previous behaviour: decode the whole source, then resize each size from it"""
+    img = Image.open(BytesIO(data))
+    img.load()
+    for max_side in RENDITION_SIZES.values():
+        resized = img.copy()
+        resized.thumbnail((max_side, max_side))
+        resized.save(BytesIO(), format='JPEG', quality=85)
+
+
+def reduced_decode(data):
+    """products.imaging: draft-mode decode, then cascade down through the sizes"""
+    img, source_format = imaging.load_downscaled(BytesIO(data), max(RENDITION_SIZES.values()))
+    for max_side in sorted(RENDITION_SIZES.values(), reverse=True):
+        img = imaging.fit(img, max_side)
+        imaging.encode(img, source_format)
+
+
+def measure(name, data):
+    """Run one variant; return (seconds, extra peak RSS in MB)"""
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    {'full': full_decode, 'reduced': reduced_decode}[name](data)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, (peak - baseline) / 1024
+
+
+class Command(BaseCommand):
+    help = 'Compare peak memory and time of full vs reduced-resolution image decoding'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=int, default=50)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        width = int((options['megapixels'] * 1_000_000 * 4 / 3) ** 0.5)
+        height = width * 3 // 4
+        self.stdout.write(f'Generating a {width}x{height} JPEG...')
+        data = synthetic_photo(width, height)
+        self.stdout.write(f'Source: {len(data) / 1024 / 1024:.1f} MB encoded')
+
+        # A forked process per run so each peak RSS belongs to one variant
+        context = multiprocessing.get_context('fork')
+        for name in ('full', 'reduced'):
+            results = []
+            for _ in range(options['runs']):
+                with context.Pool(1) as pool:
+                    results.append(pool.apply(measure, (name, data)))
+            seconds = min(result[0] for result in results)
+            memory = max(result[1] for result in results)
+            self.stdout.write(
+                f'{name:>8} decode: {seconds * 1000:7.0f} ms, peak +{memory:6.0f} MB'
+            )
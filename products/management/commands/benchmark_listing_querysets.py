@@ -0,0 +1,119 @@
+import pickle
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from products.models import Brand, Category, Product
+
+PAGE_SIZE = 12
+
+
+class Rollback(Exception):
+    pass
+
+
+def row_bytes(queryset):
+    """Bytes of column data the database returns for queryset"""
+    sql, params = queryset.query.sql_with_params()
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            for value in row:
+                total += len(value.encode() if isinstance(value, str) else str(value))
+    return total
+
+
+def object_bytes(products):
+    """Pickled size of loaded products, a proxy for their memory footprint"""
+    return len(pickle.dumps([product.__dict__ for product in products]))
+
+
+class Command(BaseCommand):
+    help = 'Compare full Product rows with ProductQuerySet.for_listing() on listing pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Create this many products for the run and roll them back')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not options['synthetic']:
+            self.benchmark(options)
+            return
+        try:
+            with transaction.atomic():
+                self.create_products(options['synthetic'], random.Random(options['seed']))
+                self.benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_products(self, total, rng):
+        vendor, _ = get_user_model().objects.get_or_create(
+            username='benchmark-vendor', defaults={'role': 'vendor'}
+        )
+        category = Category.objects.create(name='Benchmark category', slug='benchmark-category')
+        brand = Brand.objects.create(name='Benchmark brand', slug='benchmark-brand')
+        filler = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+        Product.objects.bulk_create([
+            Product(
+                name=f'Benchmark product {pk}',
+                slug=f'benchmark-product-{pk}',
+                sku=f'BENCH{pk}',
+                description=filler * rng.randrange(20, 80),
+                meta_title=f'Benchmark product {pk}',
+                meta_description=filler * 2,
+                price=rng.randrange(100, 100000) / 100,
+                cost_price=rng.randrange(50, 50000) / 100,
+                stock=rng.randrange(0, 100),
+                category=category,
+                brand=brand,
+                vendor=vendor,
+                status='active',
+            )
+            for pk in range(total)
+        ], batch_size=1000)
+        self.stdout.write(f'Created {total:,} synthetic products')
+
+    def benchmark(self, options):
+        querysets = {
+            'full rows': Product.objects.active().select_related(
+                'category', 'brand'
+            ).with_main_image(),
+            'for_listing()': Product.objects.active().for_listing(),
+        }
+        results = {}
+        for label, queryset in querysets.items():
+            queryset = queryset.order_by('-created_at', '-id')
+            pages = [
+                queryset[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+                for page in range(options['pages'])
+            ]
+            fetched = sum(row_bytes(page) for page in pages)
+            loaded = sum(object_bytes(list(page)) for page in pages)
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                for page in pages:
+                    list(page.all())
+                timings.append((time.perf_counter() - started) * 1000 / len(pages))
+            results[label] = (fetched, loaded, statistics.median(timings))
+
+        for label, (fetched, loaded, timing) in results.items():
+            self.stdout.write(
+                f'{label:>14}: {fetched / options["pages"] / 1024:7.1f} KiB fetched/page, '
+                f'{loaded / options["pages"] / 1024:7.1f} KiB objects/page, '
+                f'{timing:6.2f} ms/page'
+            )
+        (full_fetched, full_loaded, _), (fetched, loaded, _) = results.values()
+        if full_fetched and full_loaded:
+            self.stdout.write(
+                f'Bytes fetched down {100 - 100 * fetched / full_fetched:.0f}%, '
+                f'object size down {100 - 100 * loaded / full_loaded:.0f}%'
+            )
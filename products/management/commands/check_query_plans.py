@@ -0,0 +1,87 @@
+from itertools import product as combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from products.models import Product
+from products.pagination import SORT_KEYS, KeysetPaginator
+from products.views import ProductListView
+
+# Filters a catalog listing can combine, each checked with the sorts below
+FILTERS = {
+    'active': {},
+    'price range': {'min_price': '10', 'max_price': '100'},
+    'category': {'category': 'any-category'},
+    'brand': {'brand': 'any-brand'},
+    'in stock': {'in_stock': '1'},
+}
+# Sorts with a matching index for each filter, see Product.Meta.indexes
+SORTS = {
+    'active': list(SORT_KEYS),
+    # A price range and another sort can't both come from one index
+    'price range': ['price', '-price'],
+    'category': ['-created_at', 'created_at', 'price', '-price'],
+    'brand': ['-created_at', 'created_at', 'price', '-price'],
+    'in stock': ['-created_at', 'created_at', 'price', '-price'],
+}
+
+# Filters that should use a particular (partial) index
+EXPECTED_INDEXES = {
+    'in stock': 'product_orderable_',
+}
+
+
+def problems(plan, expected_index=None):
+    """Reasons an SQLite query plan would not be served by an index"""
+    table = Product._meta.db_table
+    found = []
+    if expected_index and expected_index not in plan:
+        found.append(f'does not use {expected_index}* indexes')
+    if 'TEMP B-TREE' in plan:
+        found.append('sorts in a temporary B-tree')
+    product_steps = [line for line in plan.splitlines() if f' {table} ' in f'{line} ']
+    if not any('INDEX' in line for line in product_steps):
+        found.append(f'reads {table} without an index')
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that every supported product listing filter and sort is '
+        'served by an index, without a sort step (SQLite only)'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plans can only be checked on SQLite')
+
+        factory = RequestFactory()
+        # Last row of a previous page, for the seek condition of keyset pages
+        boundary = Product(id=1, name='m', price=1, rating_average=1, created_at=timezone.now())
+        failures = 0
+        for name, params in FILTERS.items():
+            for sort, keyset in combinations(SORTS[name], (False, True)):
+                view = ProductListView()
+                view.setup(factory.get('/products/', {**params, 'sort': sort}))
+                queryset = view.get_queryset()
+                if keyset:
+                    ordering = SORT_KEYS[sort]
+                    paginator = KeysetPaginator(queryset, view.paginate_by, sort)
+                    queryset = paginator._seek(
+                        queryset, ordering,
+                        [getattr(boundary, field.lstrip('-')) for field in ordering]
+                    )
+                plan = queryset[:view.paginate_by].explain()
+                found = problems(plan, EXPECTED_INDEXES.get(name))
+                label = f'{name}, sort={sort}{" (keyset)" if keyset else ""}'
+                if found:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f'FAIL {label}: {"; ".join(found)}'))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(f'ok   {label}')
+
+        if failures:
+            raise CommandError(f'{failures} listing queries are not served by an index')
+        self.stdout.write(self.style.SUCCESS('Every listing query is served by an index'))
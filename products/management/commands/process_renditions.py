@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from products.models import ProductImage
+from products.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate renditions for product images that are pending or failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate renditions for every product image'
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            images = images.exclude(rendition_status='ready')
+
+        processed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            generate_renditions(image_id)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} product images.'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Category, CATEGORY_PATH_STEP, Product
+from products.pagination import invalidate_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute materialized paths and depths for all categories'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        categories = {category.pk: category for category in Category.objects.all()}
+        children = {}
+        for category in categories.values():
+            children.setdefault(category.parent_id, []).append(category)
+
+        # Walk down from the roots, assigning paths parent first
+        visited = set()
+        changed = []
+        stack = [(root, '', 0) for root in children.get(None, [])]
+        while stack:
+            category, parent_path, depth = stack.pop()
+            visited.add(category.pk)
+            path = f'{parent_path}{category.pk:0{CATEGORY_PATH_STEP}d}/'
+            if category.path != path or category.depth != depth:
+                category.path, category.depth = path, depth
+                changed.append(category)
+            stack.extend(
+                (child, path, depth + 1) for child in children.get(category.pk, [])
+            )
+
+        Category.objects.bulk_update(changed, ['path', 'depth'], batch_size=500)
+        if changed:
+            # Subtree listings now hold other products
+            invalidate_counts(Product)
+
+        unreachable = set(categories) - visited
+        if unreachable:
+            self.stdout.write(self.style.WARNING(
+                f'{len(unreachable)} categories are part of a parent cycle and were '
+                f'left untouched: {sorted(unreachable)}'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt category tree: {len(changed)} of {len(categories)} categories updated.'
+        ))
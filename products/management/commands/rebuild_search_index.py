@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} products with {backend.__class__.__name__}.'
+        ))
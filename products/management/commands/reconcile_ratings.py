@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from products.models import Product, Review
+
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_average'] + [
+    f'rating_{stars}' for stars in range(1, 6)
+]
+
+
+class Command(BaseCommand):
+    help = 'Recompute product rating aggregates from approved reviews'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        histograms = {}
+        rows = Review.objects.filter(is_approved=True).values(
+            'product_id', 'rating'
+        ).annotate(total=Count('id')).order_by()
+        for row in rows:
+            histograms.setdefault(row['product_id'], {})[row['rating']] = row['total']
+
+        changed = []
+        products = Product.objects.only('pk', *RATING_FIELDS)
+        for product in products.iterator(chunk_size=2000):
+            histogram = histograms.get(product.pk, {})
+            expected = {f'rating_{stars}': histogram.get(stars, 0) for stars in range(1, 6)}
+            expected['rating_count'] = sum(histogram.values())
+            expected['rating_sum'] = sum(stars * n for stars, n in histogram.items())
+            expected['rating_average'] = (
+                expected['rating_sum'] / expected['rating_count']
+                if expected['rating_count'] else 0.0
+            )
+            if any(getattr(product, name) != value for name, value in expected.items()):
+                for name, value in expected.items():
+                    setattr(product, name, value)
+                changed.append(product)
+
+        Product.objects.bulk_update(changed, RATING_FIELDS, batch_size=500)
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled ratings: {len(changed)} products corrected.'
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired checkout holds'
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds.'))
@@ -0,0 +1,121 @@
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from products.inventory import InsufficientStock, checkout
+from products.models import Product, StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent checkouts against a few scarce products and check '
+        'that stock was never oversold and the ledger adds up'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--checkouts', type=int, default=25, help='Checkouts per worker')
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=100, help='Initial stock per product')
+        parser.add_argument('--max-quantity', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        vendor, _ = get_user_model().objects.get_or_create(
+            username='stress-vendor', defaults={'role': 'vendor'}
+        )
+        products = [
+            Product.objects.create(
+                name=f'Stress product {n}',
+                slug=f'stress-product-{n}-{options["seed"]}',
+                sku=f'STRESS{n}-{options["seed"]}',
+                description='Stress test product',
+                price=10,
+                stock=options['stock'],
+                vendor=vendor,
+                status='active',
+            )
+            for n in range(options['products'])
+        ]
+        try:
+            self.run(products, options)
+        finally:
+            Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+
+    def run(self, products, options):
+        product_ids = [product.pk for product in products]
+        timings = []
+        outcomes = {'ordered': 0, 'insufficient': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(number):
+            rng = random.Random(options['seed'] + number)
+            try:
+                for n in range(options['checkouts']):
+                    lines = {
+                        product_id: rng.randint(1, options['max_quantity'])
+                        for product_id in rng.sample(product_ids, rng.randint(1, len(product_ids)))
+                    }
+                    key = f'stress:{number}:{n}'
+                    started = time.perf_counter()
+                    try:
+                        checkout(key, lines, reference=key)
+                        outcome = 'ordered'
+                    except InsufficientStock:
+                        outcome = 'insufficient'
+                    except DatabaseError as e:
+                        outcome = 'errors'
+                        self.stderr.write(f'{key}: {e}')
+                    with lock:
+                        timings.append((time.perf_counter() - started) * 1000)
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=worker, args=(number,))
+            for number in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        self.stdout.write(
+            f'{len(timings)} checkouts in {elapsed:.1f} s: {outcomes["ordered"]} ordered, '
+            f'{outcomes["insufficient"]} refused for stock, {outcomes["errors"]} database errors'
+        )
+        self.stdout.write(
+            f'Latency: p50 {statistics.median(timings):.1f} ms, '
+            f'p99 {timings[int(len(timings) * 0.99) - 1]:.1f} ms, max {timings[-1]:.1f} ms'
+        )
+
+        problems = []
+        if outcomes['errors']:
+            problems.append(f'{outcomes["errors"]} checkouts failed on database errors')
+        stocks = Product.objects.filter(pk__in=product_ids).annotate(
+            ledger=Sum('stock_movements__quantity')
+        ).values_list('pk', 'stock', 'ledger')
+        for product_id, stock, ledger in stocks:
+            sold = StockReservation.objects.filter(
+                product_id=product_id, status='ordered', from_stock=True
+            ).aggregate(total=Sum('quantity'))['total'] or 0
+            self.stdout.write(
+                f'Product {product_id}: {sold} sold, {stock} left, ledger sums to {ledger}'
+            )
+            if sold + stock != options['stock']:
+                problems.append(f'product {product_id} sold {sold} of {options["stock"]} but has {stock} left')
+            if ledger != stock:
+                problems.append(f'product {product_id} ledger sums to {ledger}, stock is {stock}')
+
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No oversell, ledger matches stock'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from products.models import ORDERABLE, Product
+from products.pagination import invalidate_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored is_orderable flag of every product'
+
+    def handle(self, *args, **options):
+        Product.objects.update_orderable()
+        invalidate_counts(Product)
+        orderable = Product.objects.filter(ORDERABLE).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated is_orderable: {orderable} of {Product.objects.count()} products orderable.'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import TOP_K, update_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Update "frequently bought together" recommendations from new orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Drop all co-purchase counts and rebuild them from every order'
+        )
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+
+    def handle(self, *args, **options):
+        run = update_recommendations(full=options['full'], k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {run.orders_processed} orders up to #{run.last_order_id}, '
+            f'{run.products_updated} products updated.'
+        ))
@@ -1,19 +1,77 @@
 from django.db import models
+from django.db.models import BooleanField, ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Substr
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
+from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from PIL import Image
 import os
 
+from .storage import content_addressed_storage
+
 User = get_user_model()
 
+# Width of one zero-padded id segment in Category.path
+CATEGORY_PATH_STEP = 8
+
+
+def category_path_range(path, field='path'):
+    """
+    Filter for a subtree by materialized path.
+
+    Paths only contain digits and '/', so every descendant of 'a/' sorts
+    between 'a/' and 'a0'; a range keeps the lookup on the B-tree index.
+    """
+    return Q(**{f'{field}__gte': path, f'{field}__lt': path[:-1] + '0'})
+
+
+class CategoryQuerySet(models.QuerySet):
+    def roots(self):
+        return self.filter(depth=0)
+
+    def subtree(self, category, include_self=True):
+        """Category and all its descendants, in one indexed query"""
+        queryset = self.filter(category.subtree_q())
+        if not include_self:
+            queryset = queryset.exclude(pk=category.pk)
+        return queryset
+
+    def as_tree(self):
+        """
+        Return root categories with a `tree_children` list on every node.
+
+        Only categories in this queryset are included, loaded in one query.
+        """
+        nodes = list(self.order_by('path'))
+        by_id = {}
+        roots = []
+        for node in nodes:
+            node.tree_children = []
+            by_id[node.pk] = node
+            parent = by_id.get(node.parent_id)
+            if parent is not None:
+                parent.tree_children.append(node)
+            elif node.parent_id is None:
+                roots.append(node)
+        for node in nodes:
+            node.tree_children.sort(key=lambda child: child.name)
+        roots.sort(key=lambda root: root.name)
+        return roots
+
+
 class Category(models.Model):
     """Product categories"""
     
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True)
-    image = models.ImageField(upload_to='categories/', null=True, blank=True)
+    image = models.ImageField(
+        upload_to='categories/',
+        storage=content_addressed_storage,
+        null=True,
+        blank=True
+    )
     parent = models.ForeignKey(
         'self', 
         on_delete=models.CASCADE, 
@@ -23,6 +81,13 @@ class Category(models.Model):
     )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Materialized path of zero-padded ids from the root, e.g. '00000003/00000017/'
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -31,13 +96,71 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and self.parent.is_descendant_of(self):
+            raise ValidationError({'parent': 'A category cannot be moved below itself.'})
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.pk and self.parent_id and self.parent.is_descendant_of(self):
+            raise ValueError('A category cannot be moved below itself.')
         super().save(*args, **kwargs)
+        self._update_path()
+    
+    def _update_path(self):
+        """Recompute this category's path, and its subtree's if it moved"""
+        parent_path = self.parent.path if self.parent_id else ''
+        new_path = f'{parent_path}{self.pk:0{CATEGORY_PATH_STEP}d}/'
+        new_depth = self.parent.depth + 1 if self.parent_id else 0
+        if new_path == self.path and new_depth == self.depth:
+            return
+        
+        old_path, old_depth = self.path, self.depth
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            Category.objects.filter(category_path_range(old_path)).exclude(
+                pk=self.pk
+            ).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth)
+            )
+        self.path, self.depth = new_path, new_depth
     
     def get_absolute_url(self):
         return reverse('products:category_detail', kwargs={'slug': self.slug})
+    
+    def is_descendant_of(self, other, include_self=True):
+        if not self.path or not other.path:
+            return include_self and self.pk == other.pk
+        if self.pk == other.pk:
+            return include_self
+        return self.path.startswith(other.path)
+    
+    def get_ancestor_ids(self, include_self=False):
+        ids = [int(segment) for segment in self.path.split('/') if segment]
+        return ids if include_self else ids[:-1]
+    
+    def get_ancestors(self, include_self=False):
+        """Ancestors from the root down, for breadcrumbs"""
+        return Category.objects.filter(
+            pk__in=self.get_ancestor_ids(include_self)
+        ).order_by('depth')
+    
+    def subtree_q(self, prefix=''):
+        """
+        Q matching this category and its descendants.
+
+        With a prefix such as 'category__' it filters a related model, e.g.
+        all products anywhere below this category.
+        """
+        if not self.path:
+            return Q(**{f'{prefix}pk': self.pk})
+        return category_path_range(self.path, f'{prefix}path')
+    
+    def get_descendants(self, include_self=False):
+        return Category.objects.subtree(self, include_self=include_self)
 
 
 class Brand(models.Model):
@@ -46,9 +169,15 @@ class Brand(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True)
-    logo = models.ImageField(upload_to='brands/', null=True, blank=True)
+    logo = models.ImageField(
+        upload_to='brands/',
+        storage=content_addressed_storage,
+        null=True,
+        blank=True
+    )
     website = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
@@ -59,6 +188,69 @@ class Brand(models.Model):
         super().save(*args, **kwargs)
 
 
+# Product columns shown on cards and listing pages; see ProductQuerySet.for_listing()
+LISTING_FIELDS = (
+    'id', 'name', 'slug', 'short_description', 'price', 'compare_price',
+    'stock', 'track_inventory', 'allow_backorders', 'category', 'brand',
+    'featured', 'rating_count', 'rating_average', 'status', 'is_active',
+    'is_orderable', 'created_at', 'updated_at',
+)
+# Characters of the description loaded for cards without a short description
+EXCERPT_LENGTH = 300
+
+# Product.can_be_ordered() as a database condition, stored in Product.is_orderable
+ORDERABLE = Q(is_active=True, status='active') & (
+    Q(track_inventory=False) | Q(stock__gt=0) | Q(allow_backorders=True)
+)
+# Fields is_orderable is computed from
+ORDERABLE_FIELDS = {'is_active', 'status', 'track_inventory', 'stock', 'allow_backorders'}
+
+
+class ProductQuerySet(models.QuerySet):
+    def active(self):
+        """Products on sale"""
+        return self.filter(is_active=True, status='active')
+    
+    def orderable(self):
+        """Products on sale that can be ordered now, from the indexed is_orderable flag"""
+        return self.filter(is_orderable=True)
+    
+    def update_orderable(self, **fields):
+        """Recompute is_orderable, e.g. after changing stock or status with update()"""
+        return self.update(
+            is_orderable=ExpressionWrapper(ORDERABLE, output_field=BooleanField()), **fields
+        )
+    
+    def for_listing(self):
+        """
+        Load only what cards and listings show: no full description, SEO or
+        cost columns, category and brand names joined, main image prefetched.
+        """
+        return self.only(
+            *LISTING_FIELDS,
+            'category__name', 'category__slug', 'brand__name', 'brand__slug'
+        ).select_related('category', 'brand').annotate(
+            description_excerpt=Substr('description', 1, EXCERPT_LENGTH)
+        ).with_main_image()
+    
+    def for_detail(self):
+        """Everything the product page shows, with category, brand and images"""
+        return self.defer('cost_price').select_related('category', 'brand').prefetch_related(
+            models.Prefetch(
+                'images',
+                queryset=ProductImage.objects.prefetch_related('renditions')
+            )
+        )
+    
+    def with_main_image(self):
+        """Load every product's main image in one extra query (see Product.main_image)"""
+        return self.prefetch_related(models.Prefetch(
+            'images',
+            queryset=ProductImage.objects.filter(is_main=True).prefetch_related('renditions'),
+            to_attr='main_images'
+        ))
+
+
 class Product(models.Model):
     """Main product model"""
     
@@ -76,6 +268,9 @@ class Product(models.Model):
     
     # Pricing
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Bumped on save whenever price changes, so carts can spot stale prices;
+    # QuerySet.update(price=...) must bump it too
+    price_version = models.PositiveIntegerField(default=1, editable=False)
     compare_price = models.DecimalField(
         max_digits=10, 
         decimal_places=2, 
@@ -96,6 +291,8 @@ class Product(models.Model):
     stock = models.PositiveIntegerField(default=0)
     track_inventory = models.BooleanField(default=True)
     allow_backorders = models.BooleanField(default=False)
+    # can_be_ordered(), kept in sync on save and by ProductQuerySet.update_orderable()
+    is_orderable = models.BooleanField(default=False, editable=False)
     
     # Relationships
     category = models.ForeignKey(
@@ -137,32 +334,100 @@ class Product(models.Model):
     meta_description = models.CharField(max_length=160, blank=True)
     featured = models.BooleanField(default=False)
     
+    # Approved review aggregates, maintained by products.signals
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    
     # Status and timestamps
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['status', 'is_active']),
-            models.Index(fields=['category', 'status']),
+            # Listings filter on status, then sort by one of
+            # pagination.SORT_KEYS with id breaking ties; descending sorts scan
+            # the same index backwards. is_active is left out: Django tests it
+            # as a bare boolean, which SQLite can't match to an index column,
+            # and so few on-sale rows are inactive that filtering them is free.
+            models.Index(fields=['status', 'created_at', 'id'], name='product_active_created_idx'),
+            models.Index(fields=['status', 'price', 'id'], name='product_active_price_idx'),
+            models.Index(fields=['status', 'name', 'id'], name='product_active_name_idx'),
+            models.Index(fields=['status', 'rating_average', 'id'], name='product_active_rating_idx'),
+            # Category and brand listings, newest first or by price
+            models.Index(
+                fields=['category', 'status', 'created_at', 'id'], name='product_category_created_idx'
+            ),
+            models.Index(
+                fields=['category', 'status', 'price', 'id'], name='product_category_price_idx'
+            ),
+            models.Index(
+                fields=['brand', 'status', 'created_at', 'id'], name='product_brand_created_idx'
+            ),
+            models.Index(fields=['brand', 'status', 'price', 'id'], name='product_brand_price_idx'),
+            # In-stock listings, only over the products that can be ordered
+            models.Index(
+                fields=['status', 'created_at', 'id'],
+                condition=Q(is_orderable=True),
+                name='product_orderable_created_idx'
+            ),
+            models.Index(
+                fields=['status', 'price', 'id'],
+                condition=Q(is_orderable=True),
+                name='product_orderable_price_idx'
+            ),
             models.Index(fields=['vendor', 'status']),
+            models.Index(fields=['updated_at']),
         ]
     
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Price as loaded, None when deferred
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         
+        update_fields = kwargs.get('update_fields')
+        saves_price = update_fields is None or 'price' in update_fields
+        loaded_price = getattr(self, '_loaded_price', None)
+        bumps_version = saves_price and loaded_price is not None and self.price != loaded_price
+        if bumps_version:
+            # Incremented in the UPDATE, so concurrent repricings each count
+            self.price_version = F('price_version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'price_version'}
+        
         # Auto-generate SKU if not provided
         if not self.sku:
             self.sku = f"PRD{self.id or ''}{slugify(self.name)[:10].upper()}"
         
+        self.is_orderable = self.can_be_ordered()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ORDERABLE_FIELDS & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'is_orderable'}
+        
         super().save(*args, **kwargs)
+        if bumps_version:
+            self.refresh_from_db(fields=['price_version'])
+        if saves_price:
+            self._loaded_price = self.price
     
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'slug': self.slug})
@@ -181,10 +446,59 @@ class Product(models.Model):
             return int(((self.compare_price - self.price) / self.compare_price) * 100)
         return 0
     
+    @property
+    def excerpt(self):
+        """Short description, or the start of the description for listings"""
+        if self.short_description:
+            return self.short_description
+        if hasattr(self, 'description_excerpt'):
+            # Annotated by ProductQuerySet.for_listing(), which defers description
+            return self.description_excerpt
+        return self.description
+    
+    @property
+    def rating_histogram(self):
+        """Number of approved reviews per star, from 5 down to 1"""
+        return {stars: getattr(self, f'rating_{stars}') for stars in range(5, 0, -1)}
+    
+    @classmethod
+    def adjust_rating(cls, product_id, rating, delta):
+        """Atomically add (delta=1) or remove (delta=-1) one review's rating"""
+        count = F('rating_count') + delta
+        total = F('rating_sum') + delta * rating
+        return cls.objects.filter(pk=product_id).update(
+            rating_count=count,
+            rating_sum=total,
+            # Both sides see the pre-update row, so recompute from the new totals
+            rating_average=Coalesce(
+                Cast(total, FloatField()) / NullIf(count, 0),
+                Value(0.0),
+                output_field=FloatField()
+            ),
+            **{f'rating_{rating}': F(f'rating_{rating}') + delta},
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def touch(cls, product_id):
+        """Bump updated_at when something shown with the product changes, e.g. its images"""
+        return cls.objects.filter(pk=product_id).update(updated_at=timezone.now())
+    
+    @property
+    def main_product_image(self):
+        """Get the main ProductImage, with its renditions"""
+        if hasattr(self, 'main_images'):
+            # Prefetched by ProductQuerySet.with_main_image()
+            return self.main_images[0] if self.main_images else None
+        if 'images' in getattr(self, '_prefetched_objects_cache', {}):
+            # Prefetched by ProductQuerySet.for_detail()
+            return next((image for image in self.images.all() if image.is_main), None)
+        return self.images.filter(is_main=True).first()
+    
     @property
     def main_image(self):
         """Get the main product image"""
-        main_img = self.images.filter(is_main=True).first()
+        main_img = self.main_product_image
         return main_img.image if main_img else None
     
     def can_be_ordered(self, quantity=1):
@@ -204,15 +518,27 @@ class Product(models.Model):
 class ProductImage(models.Model):
     """Product images"""
     
+    RENDITION_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     product = models.ForeignKey(
         Product, 
         on_delete=models.CASCADE, 
         related_name='images'
     )
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=content_addressed_storage)
     alt_text = models.CharField(max_length=200, blank=True)
     is_main = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    rendition_status = models.CharField(
+        max_length=10,
+        choices=RENDITION_STATUS_CHOICES,
+        default='pending',
+        editable=False
+    )
     
     class Meta:
         ordering = ['order', 'id']
@@ -228,15 +554,85 @@ class ProductImage(models.Model):
                 is_main=True
             ).update(is_main=False)
         
+        # A new or replaced upload needs fresh renditions
+        stored_name = None
+        if self.pk:
+            stored_name = ProductImage.objects.filter(pk=self.pk).values_list(
+                'image', flat=True
+            ).first()
+        image_changed = bool(self.image) and self.image.name != stored_name
+        if image_changed:
+            self.rendition_status = 'pending'
+        
         super().save(*args, **kwargs)
         
-        # Resize image
-        if self.image:
-            img = Image.open(self.image.path)
-            if img.height > 800 or img.width > 800:
-                output_size = (800, 800)
-                img.thumbnail(output_size)
-                img.save(self.image.path)
+        # Resizing happens in the background so the upload request returns at once
+        if image_changed:
+            from .renditions import schedule_renditions
+            schedule_renditions(self.pk)
+    
+    def get_rendition(self, size, format=None):
+        """Return the rendition for size (and format), or None if not generated yet"""
+        for rendition in self.renditions.all():
+            if rendition.size == size and (format is None or rendition.format == format):
+                return rendition
+        return None
+    
+    def rendition_url(self, size, format=None):
+        """URL of a rendition, falling back to the original upload"""
+        rendition = self.get_rendition(size, format)
+        return rendition.file.url if rendition else self.image.url
+    
+    def get_srcset(self, format=None):
+        """srcset attribute value for the generated renditions, '' until ready"""
+        renditions = sorted(
+            (r for r in self.renditions.all() if format is None or r.format == format),
+            key=lambda r: r.width
+        )
+        return ', '.join(f'{r.file.url} {r.width}w' for r in renditions)
+
+
+class ProductImageRendition(models.Model):
+    """Resized copy of a product image in a given size and format"""
+    
+    SIZE_CHOICES = [
+        ('card', 'Card'),
+        ('detail', 'Detail'),
+        ('zoom', 'Zoom'),
+    ]
+    
+    image = models.ForeignKey(
+        ProductImage,
+        on_delete=models.CASCADE,
+        related_name='renditions'
+    )
+    size = models.CharField(max_length=10, choices=SIZE_CHOICES)
+    format = models.CharField(max_length=10)
+    file = models.ImageField(
+        upload_to='products/renditions/',
+        storage=content_addressed_storage
+    )
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['image', 'size', 'format']
+    
+    def __str__(self):
+        return f"{self.image} ({self.size}, {self.format})"
+
+
+class MediaBlob(models.Model):
+    """Reference count of a file in content-addressed storage"""
+    
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
 
 
 class ProductAttribute(models.Model):
@@ -290,4 +686,130 @@ class Review(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} - {self.product.name} ({self.rating}/5)"
\ No newline at end of file
+        return f"{self.user.username} - {self.product.name} ({self.rating}/5)"
+
+class ProductCoPurchase(models.Model):
+    """Number of orders that contain both products (product == other: orders containing it)"""
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['product', 'other']
+    
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders}"
+
+
+class ProductRecommendation(models.Model):
+    """Precomputed "frequently bought together" neighbour of a product"""
+    
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    recommended = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recommended_with'
+    )
+    rank = models.PositiveSmallIntegerField()
+    # Share of the product's orders that also contained the recommended one
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = ['product', 'rank']
+        ordering = ['product', 'rank']
+    
+    def __str__(self):
+        return f"{self.product} -> {self.recommended} (#{self.rank})"
+
+
+class CoPurchaseRun(models.Model):
+    """A run of the co-purchase job and the last order it covered"""
+    
+    last_order_id = models.PositiveBigIntegerField(default=0)
+    orders_processed = models.PositiveIntegerField(default=0)
+    products_updated = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Co-purchase run up to order {self.last_order_id}"
+
+
+class StockMovement(models.Model):
+    """Append-only ledger of changes to Product.stock; the quantities of a product sum to its stock"""
+    
+    KIND_CHOICES = [
+        ('adjustment', 'Adjustment'),
+        ('hold', 'Held for checkout'),
+        ('release', 'Hold released'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    quantity = models.IntegerField(help_text='Change to stock, negative when stock is taken')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    reservation = models.ForeignKey(
+        'StockReservation',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='movements'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} x {self.product_id}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError('Stock movements are append-only')
+        super().save(*args, **kwargs)
+
+
+class StockReservation(models.Model):
+    """Stock held for one checkout line until it is ordered or the hold expires"""
+    
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('ordered', 'Ordered'),
+        ('released', 'Released'),
+    ]
+    
+    # Whose checkout holds the stock, e.g. 'user:42'
+    key = models.CharField(max_length=100)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    # Held without taking stock: untracked or backordered products
+    from_stock = models.BooleanField(default=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held')
+    reference = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Order the hold became, or the release that returned its stock'
+    )
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['key', 'status']),
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['reference']),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.key} ({self.status})"
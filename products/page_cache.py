@@ -0,0 +1,122 @@
+"""
+Full-page cache for anonymous visitors of catalog detail pages.
+
+Anonymous GETs with no cart and no pending messages get the same page, so
+it is rendered once and reused. After a render the view reports which
+version namespaces the page showed (the product, its category and brand,
+related products, the listed products, navigation); those are stored per
+slug and embedded, with their current versions, in the page's key. Any
+signal that bumps one of them makes the next request miss and re-render.
+Pages listing products also depend on a 'listing:' namespace, bumped when
+a product is added to or leaves the category or brand.
+
+CSRF tokens are swapped for a placeholder before caching and a fresh
+token for the visitor is put back on every hit.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .cache import bump_version, get_versions
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+CSRF_VALUE_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def category_listing_namespace(category_id):
+    return f'listing:category:{category_id}'
+
+
+def brand_listing_namespace(brand_id):
+    return f'listing:brand:{brand_id}'
+
+
+def invalidate_listings(category_path, brand_id):
+    """Expire category pages (up to the root) and the brand page listing a product"""
+    for segment in filter(None, category_path.split('/')):
+        bump_version(category_listing_namespace(int(segment)))
+    if brand_id:
+        bump_version(brand_listing_namespace(brand_id))
+
+
+def is_cacheable(request):
+    """Whether the request would get the same page as every other anonymous visitor"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    if request.session.get(settings.CART_SESSION_ID):
+        return False
+    return not get_messages(request)
+
+
+def _query_digest(request):
+    return hashlib.md5(repr(sorted(request.GET.lists())).encode()).hexdigest()
+
+
+def _dependencies_key(name, slug, query_digest):
+    return f'catalog:page:{name}:{slug}:{query_digest}:dependencies'
+
+
+def _page_key(name, slug, query_digest, versions):
+    digest = hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+    return f'catalog:page:{name}:{slug}:{query_digest}:{digest}'
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve anonymous GETs of a slug-addressed detail view from the page cache.
+
+    Views set page_cache_name and implement get_page_cache_namespaces().
+    """
+    page_cache_name = None
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def get_page_cache_namespaces(self, context):
+        """Version namespaces of everything the rendered page shows"""
+        return ['navigation']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        slug = kwargs['slug']
+        query_digest = _query_digest(request)
+        page = None
+        namespaces = cache.get(_dependencies_key(self.page_cache_name, slug, query_digest))
+        if namespaces is not None:
+            versions = get_versions(namespaces)
+            page = cache.get(_page_key(self.page_cache_name, slug, query_digest, versions))
+        if page is not None:
+            content, content_type = page
+            token = get_token(request).encode()
+            return HttpResponse(
+                content.replace(CSRF_PLACEHOLDER.encode(), token),
+                content_type=content_type
+            )
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(
+                lambda rendered: self._store_page(rendered, slug, query_digest)
+            )
+        return response
+
+    def _store_page(self, response, slug, query_digest):
+        namespaces = list(dict.fromkeys(self.get_page_cache_namespaces(response.context_data)))
+        versions = get_versions(namespaces)
+        content = CSRF_VALUE_RE.sub(
+            rb'\g<1>' + CSRF_PLACEHOLDER.encode() + rb'\g<2>', response.content
+        )
+        cache.set_many({
+            _dependencies_key(self.page_cache_name, slug, query_digest): namespaces,
+            _page_key(self.page_cache_name, slug, query_digest, versions): (
+                content, response['Content-Type']
+            ),
+        }, self.page_cache_timeout)
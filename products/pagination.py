@@ -0,0 +1,308 @@
+"""
+Pagination helpers for catalog listings.
+
+KeysetPaginator seeks past the last row of the previous page using an
+opaque cursor instead of OFFSET, and never runs COUNT(*), so deep pages
+cost the same as the first one.
+
+CachedCountPaginator keeps numbered pages but caches their COUNT(*) per
+filter, and stops counting once a result set is known to be very large;
+pages past that point are still served, each one telling whether another
+follows by fetching a row more than it shows.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from .cache import bump_version, get_version
+
+CURSOR_PARAM = 'cursor'
+
+COUNT_CACHE_TIMEOUT = 60 * 5
+# Result sets larger than this are reported as "10,000+"
+COUNT_ESTIMATE_THRESHOLD = 10000
+
+# Sort options that can be paginated by keyset, with id as tie-breaker
+SORT_KEYS = {
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    '-rating_average': ('-rating_average', '-id'),
+}
+# Search results may also be sorted by relevance, which no index serves
+RELEVANCE = '-search_rank'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _reverse(ordering):
+    return ordering[1:] if ordering.startswith('-') else f'-{ordering}'
+
+
+class KeysetPage:
+    """A page of results with cursors to its neighbours"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'previous')
+
+
+class KeysetPaginator:
+    """Seek-based paginator for querysets ordered by one of SORT_KEYS"""
+
+    def __init__(self, object_list, per_page, ordering):
+        if ordering not in SORT_KEYS:
+            raise ValueError(f'Keyset pagination does not support ordering {ordering!r}')
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = SORT_KEYS[ordering]
+        self.model = object_list.model
+
+    def _field_names(self):
+        return [ordering.lstrip('-') for ordering in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            self.model._meta.get_field(name).value_to_string(obj)
+            for name in self._field_names()
+        ]
+        payload = json.dumps({'d': direction[0], 'k': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction = {'n': 'next', 'p': 'previous'}[payload['d']]
+            names = self._field_names()
+            if len(payload['k']) != len(names):
+                raise InvalidCursor(cursor)
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, payload['k'])
+            ]
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    def _seek(self, queryset, ordering, values):
+        """Filter to rows strictly after values in the given ordering"""
+        condition = Q()
+        equal = {}
+        for order, value in zip(ordering, values):
+            name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return queryset.filter(condition)
+
+    def get_page(self, cursor=None):
+        """Return the page following (or preceding) cursor, the first page if empty or invalid"""
+        direction, values = 'next', None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = 'next', None
+
+        ordering = list(self.ordering)
+        if direction == 'previous':
+            ordering = [_reverse(order) for order in ordering]
+
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = self._seek(queryset, ordering, values)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'previous':
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=values is not None)
+
+
+def count_namespace(model):
+    """Cache namespace holding the paginator counts for model"""
+    return f'count:{model._meta.label_lower}'
+
+
+def invalidate_counts(model):
+    """Drop every cached paginator count for model"""
+    bump_version(count_namespace(model))
+
+
+class EstimatedPage(Page):
+    """A numbered page of a result set whose count is only a lower bound"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that caches its count per normalized filter.
+
+    The key is derived from the SQL of the unordered queryset and the
+    model's count version, which signals bump whenever rows change. Counting
+    stops at estimate_threshold, in which case is_estimate is set,
+    count_display reads e.g. "10,000+" and count is only a lower bound:
+    pages past it stay reachable, and whether one has a next page comes
+    from fetching per_page + 1 rows rather than from the count.
+    """
+
+    def __init__(self, object_list, per_page, *args, count_timeout=COUNT_CACHE_TIMEOUT,
+                 estimate_threshold=COUNT_ESTIMATE_THRESHOLD, **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        self.count_timeout = count_timeout
+        self.estimate_threshold = estimate_threshold
+        self.is_estimate = False
+
+    def _count_cache_key(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+        version = get_version(count_namespace(queryset.model))
+        return f'catalog:count:{queryset.model._meta.label_lower}:{version}:{self.estimate_threshold}:{digest}'
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+
+        queryset = self.object_list.order_by().values('pk')
+        key = self._count_cache_key(queryset)
+        cached = cache.get(key)
+        if cached is None:
+            limit = self.estimate_threshold
+            if limit:
+                total = queryset[:limit + 1].count()
+                cached = (min(total, limit), total > limit)
+            else:
+                cached = (queryset.count(), False)
+            cache.set(key, cached, self.count_timeout)
+
+        count, self.is_estimate = cached
+        return count
+
+    @property
+    def count_display(self):
+        count = self.count
+        return f'{count:,}+' if self.is_estimate else f'{count:,}'
+
+    @property
+    def num_pages_display(self):
+        num_pages = self.num_pages
+        return f'{num_pages:,}+' if self.is_estimate else f'{num_pages:,}'
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Pages past an estimated count may well exist; page() finds out
+            if self.is_estimate and int(number) >= 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return EstimatedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Past the end of an estimated count: fall back to its last known page
+            return self.page(self.num_pages)
+
+
+def clean_ordering(ordering, default='-created_at', allow_relevance=False):
+    """ordering if it is a supported sort, otherwise default; never pass raw input to order_by()"""
+    if ordering in SORT_KEYS or (allow_relevance and ordering == RELEVANCE):
+        return ordering
+    return default
+
+
+def order_queryset(queryset, ordering):
+    """Order by a cleaned sort, with id breaking ties as the listing indexes expect"""
+    return queryset.order_by(*SORT_KEYS.get(ordering, (ordering, '-id')))
+
+
+def wants_keyset(request, ordering):
+    """Whether the request asked for cursor pagination over a supported ordering"""
+    return CURSOR_PARAM in request.GET and ordering in SORT_KEYS
+
+
+def paginate(request, queryset, per_page, ordering):
+    """
+    Return a page of queryset for the request.
+
+    Requests carrying a cursor parameter get a KeysetPage, everything else
+    a numbered page from CachedCountPaginator.
+    """
+    if wants_keyset(request, ordering):
+        paginator = KeysetPaginator(queryset, per_page, ordering)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
+    paginator = CachedCountPaginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page'))
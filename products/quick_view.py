@@ -0,0 +1,60 @@
+"""
+Quick-view JSON for product cards.
+
+Each product's quick view is serialized once into a cache entry keyed by
+its id alone, so serving one is a single cache read. Signals rebuild the
+entry after the product, its images or its reviews change; a product that
+can't be shown is cached as an empty dict so misses for it stay cheap too.
+"""
+from django.core.cache import cache
+from django.utils.text import Truncator
+
+QUICK_VIEW_TIMEOUT = 60 * 60 * 24
+DESCRIPTION_WORDS = 40
+
+
+def quick_view_key(product_id):
+    return f'catalog:quick-view:{product_id}'
+
+
+def serialize(product):
+    """JSON-ready quick view of a product"""
+    image = product.main_product_image
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'description': product.short_description or Truncator(product.description).words(
+            DESCRIPTION_WORDS
+        ),
+        'url': product.get_absolute_url(),
+        'price': str(product.price),
+        'compare_price': str(product.compare_price) if product.compare_price else None,
+        'discount': product.discount_percentage,
+        'in_stock': product.is_orderable,
+        # Upper bound for the quantity input, None when orders aren't capped by stock
+        'stock': product.stock if product.track_inventory and not product.allow_backorders else None,
+        'image': image.rendition_url('detail') if image else None,
+        'rating': {
+            'average': round(product.rating_average, 1),
+            'count': product.rating_count,
+            'histogram': product.rating_histogram,
+        },
+    }
+
+
+def build_quick_view(product_id):
+    """Serialize a product into the cache and return it, {} if it isn't on sale"""
+    from .models import Product
+
+    product = Product.objects.active().filter(pk=product_id).with_main_image().first()
+    data = serialize(product) if product else {}
+    cache.set(quick_view_key(product_id), data, QUICK_VIEW_TIMEOUT)
+    return data
+
+
+def get_quick_view(product_id):
+    """Cached quick view of a product, {} if it isn't on sale"""
+    data = cache.get(quick_view_key(product_id))
+    if data is None:
+        data = build_quick_view(product_id)
+    return data
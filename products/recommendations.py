@@ -0,0 +1,177 @@
+"""
+"Frequently bought together" recommendations from order history.
+
+Order lines are turned into a sparse order x product incidence matrix B;
+B.T @ B then holds, for every pair of products, the number of orders that
+contain both, with each product's own order count on the diagonal. Those
+counts are additive, so a run only multiplies the orders placed since the
+previous run and adds the result to the stored ProductCoPurchase counts.
+Every product touched by the new orders then gets its TOP_K neighbours,
+ranked by co-purchase count, rewritten as ProductRecommendation rows, which
+the detail page reads with one indexed query.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+from django.db.models import Max
+
+from .autocomplete import invalidate_index
+from .conditional import invalidate_catalog
+from .models import CoPurchaseRun, Product, ProductCoPurchase, ProductRecommendation
+
+TOP_K = 8
+# Pairs bought together fewer times than this are not recommended
+MIN_CO_PURCHASES = 2
+# Orders with these statuses don't count as purchases
+EXCLUDED_ORDER_STATUSES = ('cancelled', 'refunded')
+# Product ids per query when loading stored counts
+LOAD_CHUNK_SIZE = 500
+
+
+def order_lines(after_order_id, up_to_order_id):
+    """(order_id, product_id) array of the order lines in (after, up_to]"""
+    from orders.models import OrderItem
+
+    lines = OrderItem.objects.filter(
+        order_id__gt=after_order_id,
+        order_id__lte=up_to_order_id
+    ).exclude(
+        order__status__in=EXCLUDED_ORDER_STATUSES
+    ).values_list('order_id', 'product_id')
+    flat = np.fromiter(
+        (value for line in lines.iterator(chunk_size=10000) for value in line),
+        dtype=np.int64
+    )
+    return flat.reshape(-1, 2)
+
+
+def co_purchase_matrix(lines, size):
+    """size x size CSR matrix of co-purchase counts for the given order lines"""
+    if not len(lines):
+        return sparse.csr_matrix((size, size), dtype=np.int64)
+    orders, order_index = np.unique(lines[:, 0], return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(lines), dtype=np.int64), (order_index, lines[:, 1])),
+        shape=(len(orders), size)
+    )
+    # A product listed twice in one order is still one purchase
+    incidence.data[:] = 1
+    return (incidence.T @ incidence).tocsr()
+
+
+def stored_counts(product_ids, size):
+    """size x size CSR matrix of the stored counts in the rows of product_ids"""
+    rows, cols, data = [], [], []
+    for start in range(0, len(product_ids), LOAD_CHUNK_SIZE):
+        chunk = product_ids[start:start + LOAD_CHUNK_SIZE].tolist()
+        for product_id, other_id, orders in ProductCoPurchase.objects.filter(
+            product_id__in=chunk
+        ).values_list('product_id', 'other_id', 'orders'):
+            rows.append(product_id)
+            cols.append(other_id)
+            data.append(orders)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(size, size), dtype=np.int64)
+
+
+def top_neighbours(totals, product_ids, k=TOP_K, min_count=MIN_CO_PURCHASES):
+    """
+    Top k neighbours of each of product_ids by co-purchase count.
+
+    Returns parallel arrays (product, neighbour, rank, score), where score is
+    the share of the product's orders that also contained the neighbour.
+    """
+    rows = totals[product_ids].tocoo()
+    product = product_ids[rows.row]
+    neighbour, count = rows.col, rows.data
+    own_orders = totals.diagonal()[product]
+
+    keep = (neighbour != product) & (count >= min_count)
+    product, neighbour, count, own_orders = (
+        product[keep], neighbour[keep], count[keep], own_orders[keep]
+    )
+
+    # Group by product, most co-purchased first, id to break ties
+    order = np.lexsort((neighbour, -count, product))
+    product, neighbour, count, own_orders = (
+        product[order], neighbour[order], count[order], own_orders[order]
+    )
+    group_start = np.searchsorted(product, product, side='left')
+    rank = np.arange(len(product)) - group_start
+
+    top = rank < k
+    score = count[top] / np.maximum(own_orders[top], 1)
+    return product[top], neighbour[top], rank[top] + 1, score
+
+
+def update_recommendations(full=False, k=TOP_K):
+    """
+    Fold orders placed since the last run into the co-purchase counts and
+    refresh the recommendations of every product they contain.
+
+    With full=True all counts are dropped and rebuilt from every order.
+    Returns the CoPurchaseRun recorded for this run.
+    """
+    from orders.models import Order
+
+    with transaction.atomic():
+        last_run = CoPurchaseRun.objects.order_by('-last_order_id').first()
+        after = 0 if full or last_run is None else last_run.last_order_id
+        up_to = Order.objects.aggregate(last=Max('id'))['last'] or 0
+        if full:
+            ProductCoPurchase.objects.all().delete()
+            ProductRecommendation.objects.all().delete()
+
+        lines = order_lines(after, up_to)
+        size = (Product.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        delta = co_purchase_matrix(lines, size)
+        product_ids = np.unique(delta.nonzero()[0])
+
+        totals = stored_counts(product_ids, size) + delta
+
+        # Upsert only the pairs the new orders changed
+        changed = delta.tocoo()
+        values = np.asarray(totals[changed.row, changed.col]).ravel()
+        ProductCoPurchase.objects.bulk_create(
+            [
+                ProductCoPurchase(product_id=row, other_id=col, orders=value)
+                for row, col, value in zip(
+                    changed.row.tolist(), changed.col.tolist(), values.tolist()
+                )
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['product', 'other'],
+            update_fields=['orders']
+        )
+
+        product, neighbour, rank, score = top_neighbours(totals.tocsr(), product_ids, k)
+        for start in range(0, len(product_ids), LOAD_CHUNK_SIZE):
+            ProductRecommendation.objects.filter(
+                product_id__in=product_ids[start:start + LOAD_CHUNK_SIZE].tolist()
+            ).delete()
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(
+                    product_id=product_id,
+                    recommended_id=recommended_id,
+                    rank=position,
+                    score=value
+                )
+                for product_id, recommended_id, position, value in zip(
+                    product.tolist(), neighbour.tolist(), rank.tolist(), score.tolist()
+                )
+            ],
+            batch_size=1000
+        )
+
+        # Suggestions are ranked by the order counts on the diagonal
+        transaction.on_commit(invalidate_index)
+        # Detail pages show the recommendations
+        transaction.on_commit(invalidate_catalog)
+
+        return CoPurchaseRun.objects.create(
+            last_order_id=max(up_to, after),
+            orders_processed=len(np.unique(lines[:, 0])),
+            products_updated=len(product_ids)
+        )
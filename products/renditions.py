@@ -0,0 +1,151 @@
+"""
+Background generation of product image renditions.
+
+Uploads are stored as-is; once the saving transaction commits, a worker
+from a small in-process thread pool resizes the image into every size in
+RENDITION_SIZES, as WebP and in the original format, and records each
+one as a ProductImageRendition. Until then templates fall back to the
+original file. Renditions lost to a restart are picked up again by
+'manage.py process_renditions'. An upload whose content already has
+renditions (storage is content-addressed, so equal files share a name)
+reuses them instead of resizing again.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+
+from . import fragments, imaging, quick_view
+from .models import Product, ProductImage, ProductImageRendition
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels for each rendition size
+RENDITION_SIZES = {
+    'card': 400,
+    'detail': 800,
+    'zoom': 1600,
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2),
+            thread_name_prefix='renditions'
+        )
+    return _executor
+
+
+def run_in_background(func, *args):
+    """Run func(*args) on the image worker pool after the current transaction commits"""
+    def task():
+        close_old_connections()
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Background image task %s%r failed', func.__name__, args)
+        finally:
+            close_old_connections()
+
+    transaction.on_commit(lambda: get_executor().submit(task))
+
+
+def schedule_renditions(image_id):
+    run_in_background(generate_renditions, image_id)
+
+
+def copy_renditions(product_image):
+    """Reuse the renditions of another image with identical content, if any"""
+    donor = ProductImage.objects.filter(
+        image=product_image.image.name,
+        rendition_status='ready'
+    ).exclude(pk=product_image.pk).first()
+    if donor is None:
+        return False
+
+    product_image.renditions.all().delete()
+    for rendition in donor.renditions.all():
+        rendition.file.storage.retain(rendition.file.name)
+        ProductImageRendition.objects.create(
+            image=product_image,
+            size=rendition.size,
+            format=rendition.format,
+            file=rendition.file.name,
+            width=rendition.width,
+            height=rendition.height
+        )
+    return True
+
+
+def mark_ready(product_image):
+    ProductImage.objects.filter(pk=product_image.pk).update(rendition_status='ready')
+    # Cached cards and pages still point at the original upload
+    Product.touch(product_image.product_id)
+    fragments.invalidate_product(product_image.product_id)
+    transaction.on_commit(partial(quick_view.build_quick_view, product_image.product_id))
+
+
+def generate_renditions(image_id):
+    """Create or replace every rendition of a ProductImage, marking it failed if that can't be done"""
+    try:
+        product_image = ProductImage.objects.get(pk=image_id)
+    except ProductImage.DoesNotExist:
+        return
+
+    try:
+        _generate_renditions(product_image)
+    except Exception:
+        # Unreadable or oversized sources, and failures encoding or storing
+        # the renditions, must not leave the image pending for good
+        logger.exception('Could not create renditions of %s', product_image.image.name)
+        ProductImage.objects.filter(pk=image_id).update(rendition_status='failed')
+
+
+def _generate_renditions(product_image):
+    with transaction.atomic():
+        if copy_renditions(product_image):
+            mark_ready(product_image)
+            return
+
+    largest = max(RENDITION_SIZES.values())
+    with product_image.image.open('rb') as source:
+        source_img, source_format = imaging.load_downscaled(source, largest)
+
+    formats = {'webp': 'WEBP', source_format.lower(): source_format}
+    stem = os.path.splitext(os.path.basename(product_image.image.name))[0]
+
+    # Their files are released by the post_delete signal
+    product_image.renditions.all().delete()
+
+    # Largest first, each size resampled from the previous one
+    resized = source_img
+    for size, max_side in sorted(RENDITION_SIZES.items(), key=lambda item: -item[1]):
+        # Never upscale; sizes above the original reuse the original
+        if max_side >= max(resized.size) and size != 'card':
+            continue
+        resized = imaging.fit(resized, max_side)
+        for format_name, image_format in formats.items():
+            extension = 'jpg' if image_format == 'JPEG' else format_name
+            rendition = ProductImageRendition(
+                image=product_image,
+                size=size,
+                format=format_name,
+                width=resized.width,
+                height=resized.height
+            )
+            rendition.file.save(
+                f'{stem}_{size}.{extension}',
+                ContentFile(imaging.encode(resized, image_format)),
+                save=False
+            )
+            rendition.save()
+
+    mark_ready(product_image)
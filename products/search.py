@@ -0,0 +1,279 @@
+"""
+Full-text search index for the product catalog.
+
+SQLite uses an FTS5 virtual table and PostgreSQL a weighted tsvector table
+with a GIN index. Any other database falls back to icontains filtering.
+Both indexes are keyed by product id and kept in sync by products.signals.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+# Relative weight of each indexed field when ranking results
+FIELD_WEIGHTS = {
+    'name': 10.0,
+    'short_description': 4.0,
+    'description': 1.0,
+}
+INDEXED_FIELDS = list(FIELD_WEIGHTS)
+
+REBUILD_CHUNK_SIZE = 2000
+
+_backend = None
+
+
+def _terms(query):
+    """Split a user query into plain word terms"""
+    return re.findall(r'\w+', query or '')
+
+
+def _no_matches(queryset):
+    """Empty result for a query without terms, annotated like matches so it can be ordered by rank"""
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _product_rows(queryset=None):
+    queryset = Product.objects.all() if queryset is None else queryset
+    return queryset.order_by().values_list('id', *INDEXED_FIELDS).iterator(
+        chunk_size=REBUILD_CHUNK_SIZE
+    )
+
+
+def _chunked(rows, size=REBUILD_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class FallbackSearchBackend:
+    """Unindexed icontains search for databases without a full-text index"""
+
+    def table_exists(self):
+        return True
+
+    def ensure_index(self):
+        return False
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        return 0
+
+    def filter(self, queryset, query):
+        terms = _terms(query)
+        if not terms:
+            return _no_matches(queryset)
+
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for field in INDEXED_FIELDS:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SQLiteSearchBackend(FallbackSearchBackend):
+    """FTS5 index ranked with bm25()"""
+
+    table = 'products_product_fts'
+
+    def table_exists(self):
+        return self.table in connection.introspection.table_names()
+
+    def ensure_index(self):
+        if self.table_exists():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                f"{', '.join(INDEXED_FIELDS)}, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        return True
+
+    def _write(self, cursor, rows):
+        placeholders = ', '.join(['%s'] * (len(INDEXED_FIELDS) + 1))
+        cursor.executemany(
+            f"INSERT INTO {self.table} (rowid, {', '.join(INDEXED_FIELDS)}) "
+            f"VALUES ({placeholders})",
+            rows
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product.pk])
+            self._write(cursor, [
+                [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+            ])
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        self.ensure_index()
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            for chunk in _chunked(_product_rows()):
+                self._write(cursor, [
+                    [row[0]] + [value or '' for value in row[1:]] for row in chunk
+                ])
+                total += len(chunk)
+        return total
+
+    def filter(self, queryset, query):
+        terms = _terms(query)
+        if not terms:
+            return _no_matches(queryset)
+
+        # Every term must match, each one as a prefix
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        product_table = connection.ops.quote_name(Product._meta.db_table)
+
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s",
+                [match]
+            )
+        ).annotate(
+            # bm25() is lower for better matches, negate it so higher ranks first
+            search_rank=RawSQL(
+                f"SELECT -bm25({self.table}, {weights}) FROM {self.table} "
+                f"WHERE {self.table} MATCH %s AND rowid = {product_table}.id",
+                [match],
+                output_field=FloatField()
+            )
+        )
+
+
+class PostgresSearchBackend(FallbackSearchBackend):
+    """Weighted tsvector index ranked with ts_rank()"""
+
+    table = 'products_product_search'
+    config = 'english'
+    # tsvector weight label for each indexed field
+    labels = {
+        'name': 'A',
+        'short_description': 'B',
+        'description': 'C',
+    }
+
+    def table_exists(self):
+        return self.table in connection.introspection.table_names()
+
+    def ensure_index(self):
+        if self.table_exists():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {self.table} ("
+                f"product_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX {self.table}_document ON {self.table} USING GIN (document)"
+            )
+        return True
+
+    def _document_sql(self):
+        return ' || '.join(
+            f"setweight(to_tsvector('{self.config}', %s), '{self.labels[field]}')"
+            for field in INDEXED_FIELDS
+        )
+
+    def _write(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {self.table} (product_id, document) "
+            f"VALUES (%s, {self._document_sql()}) "
+            f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+            rows
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            self._write(cursor, [
+                [product.pk] + [getattr(product, field) or '' for field in INDEXED_FIELDS]
+            ])
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = %s", [product_id])
+
+    def rebuild(self):
+        self.ensure_index()
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+            for chunk in _chunked(_product_rows()):
+                self._write(cursor, [
+                    [row[0]] + [value or '' for value in row[1:]] for row in chunk
+                ])
+                total += len(chunk)
+        return total
+
+    def filter(self, queryset, query):
+        terms = _terms(query)
+        if not terms:
+            return _no_matches(queryset)
+
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        # ts_rank() weights are given in {D, C, B, A} order
+        weights = '{%s}' % ', '.join(
+            str(weight / FIELD_WEIGHTS['name'])
+            for weight in [0.0] + list(reversed(FIELD_WEIGHTS.values()))
+        )
+        product_table = connection.ops.quote_name(Product._meta.db_table)
+
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT product_id FROM {self.table} "
+                f"WHERE document @@ to_tsquery('{self.config}', %s)",
+                [tsquery]
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank('{weights}', document, to_tsquery('{self.config}', %s)) "
+                f"FROM {self.table} WHERE product_id = {product_table}.id",
+                [tsquery],
+                output_field=FloatField()
+            )
+        )
+
+
+def get_backend():
+    """Return the search backend for the default database"""
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'sqlite':
+            _backend = SQLiteSearchBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = FallbackSearchBackend()
+    return _backend
+
+
+def search_products(queryset, query):
+    """
+    Restrict a Product queryset to full-text matches for query.
+
+    Matches are annotated with search_rank, higher being more relevant.
+    """
+    return get_backend().filter(queryset, query)
@@ -0,0 +1,227 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from .cache import bump_version
+from .models import (
+    Brand, Category, Product, ProductImage, ProductImageRendition, Review, StockMovement
+)
+from .pagination import invalidate_counts
+from .storage import ContentAddressedStorage
+from .page_cache import invalidate_listings
+from . import autocomplete, fragments, fuzzy, quick_view, search
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """Keep the full-text search index in sync with the product"""
+    search.get_backend().index_product(instance)
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the full-text search index"""
+    search.get_backend().remove_product(instance.pk)
+
+@receiver(post_migrate)
+def create_search_index(sender, app_config, **kwargs):
+    """Create the full-text search index and fill it on first migrate"""
+    if app_config.name != 'products':
+        return
+    backend = search.get_backend()
+    if backend.ensure_index():
+        backend.rebuild()
+
+@receiver(post_save, sender=Product)
+def refresh_fuzzy_index(sender, **kwargs):
+    """Fold the changed product into the trigram index once it is committed"""
+    transaction.on_commit(fuzzy.invalidate_products)
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def rebuild_fuzzy_index(sender, **kwargs):
+    """Deleted products and renamed brands or categories need a full rebuild"""
+    transaction.on_commit(fuzzy.invalidate_index)
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_navigation(sender, **kwargs):
+    """Drop the cached navigation categories and brands"""
+    bump_version('navigation')
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_fragments(sender, instance, **kwargs):
+    """Re-render cached fragments showing the product"""
+    fragments.invalidate_product(instance.pk)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_listing_pages(sender, instance, **kwargs):
+    """Expire cached category and brand pages that list or should list the product"""
+    category_path = Category.objects.filter(pk=instance.category_id).values_list(
+        'path', flat=True
+    ).first() or ''
+    invalidate_listings(category_path, instance.brand_id)
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_related_product_fragments(sender, instance, **kwargs):
+    """Re-render cached fragments of the product an image or review belongs to"""
+    fragments.invalidate_product(instance.product_id)
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    """Images carry no timestamp, so date the change on their product"""
+    Product.touch(instance.product_id)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_fragments(sender, instance, **kwargs):
+    """Re-render cached fragments showing the category"""
+    fragments.invalidate_category(instance.pk)
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_brand_fragments(sender, instance, **kwargs):
+    """Re-render cached fragments showing the brand"""
+    fragments.invalidate_brand(instance.pk)
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_autocomplete(sender, **kwargs):
+    """Fold the changed product into the autocomplete index once it is committed"""
+    transaction.on_commit(autocomplete.invalidate_products)
+
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def rebuild_autocomplete(sender, **kwargs):
+    """Deleted products and renamed brands or categories need a full rebuild"""
+    transaction.on_commit(autocomplete.invalidate_index)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_product_counts(sender, **kwargs):
+    """Drop cached listing counts when products change, or categories and so their subtrees do"""
+    invalidate_counts(Product)
+
+@receiver(pre_save, sender=Product)
+def remember_stock(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Snapshot the stored stock so post_save can record the adjustment"""
+    instance._stored_stock = 0
+    if update_fields is not None and 'stock' not in update_fields:
+        instance._stored_stock = instance.stock
+    elif instance.pk and not raw:
+        instance._stored_stock = Product.objects.filter(pk=instance.pk).values_list(
+            'stock', flat=True
+        ).first() or 0
+
+@receiver(post_save, sender=Product)
+def record_stock_adjustment(sender, instance, raw=False, **kwargs):
+    """Record stock edited by hand in the stock ledger"""
+    if raw:
+        return
+    change = instance.stock - getattr(instance, '_stored_stock', 0)
+    if change:
+        StockMovement.objects.create(product=instance, quantity=change, kind='adjustment')
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    """Snapshot the stored rating so post_save can apply the difference"""
+    instance._stored_rating = None
+    if instance.pk and not raw:
+        instance._stored_rating = Review.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'rating', 'is_approved'
+        ).first()
+
+@receiver(post_save, sender=Review)
+def update_product_rating(sender, instance, raw=False, **kwargs):
+    """Fold a new or edited review into its product's rating aggregates"""
+    if raw:
+        return
+    old = getattr(instance, '_stored_rating', None)
+    new = (instance.product_id, instance.rating, instance.is_approved)
+    if old == new:
+        return
+    with transaction.atomic():
+        if old and old[2]:
+            Product.adjust_rating(old[0], old[1], -1)
+        if instance.is_approved:
+            Product.adjust_rating(instance.product_id, instance.rating, 1)
+
+@receiver(post_delete, sender=Review)
+def remove_product_rating(sender, instance, **kwargs):
+    """Take a deleted review out of its product's rating aggregates"""
+    if instance.is_approved:
+        Product.adjust_rating(instance.product_id, instance.rating, -1)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def rebuild_quick_view(sender, instance, **kwargs):
+    """Re-serialize the product's quick view once the change is committed"""
+    transaction.on_commit(partial(quick_view.build_quick_view, instance.pk))
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def rebuild_related_quick_view(sender, instance, **kwargs):
+    """Images and reviews are part of their product's quick view; runs after the rating receivers"""
+    transaction.on_commit(partial(quick_view.build_quick_view, instance.product_id))
+
+
+def content_addressed_fields(model):
+    """Names of model's file fields kept in content-addressed storage"""
+    return [
+        field.name for field in model._meta.concrete_fields
+        if isinstance(getattr(field, 'storage', None), ContentAddressedStorage)
+    ]
+
+def release_file(field_file, name):
+    """Drop a file reference once the current transaction has committed"""
+    transaction.on_commit(partial(field_file.storage.delete, name))
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=ProductImageRendition)
+def remember_stored_files(sender, instance, raw=False, **kwargs):
+    """Snapshot stored file names so post_save can release replaced ones"""
+    instance._stored_files = {}
+    if instance.pk and not raw:
+        fields = content_addressed_fields(sender)
+        instance._stored_files = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=ProductImageRendition)
+def release_replaced_files(sender, instance, **kwargs):
+    """Release files that were replaced or cleared on save"""
+    for name, stored_name in getattr(instance, '_stored_files', {}).items():
+        field_file = getattr(instance, name)
+        if stored_name and stored_name != field_file.name:
+            release_file(field_file, stored_name)
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ProductImageRendition)
+def release_deleted_files(sender, instance, **kwargs):
+    """Release the files of a deleted row"""
+    for name in content_addressed_fields(sender):
+        field_file = getattr(instance, name)
+        if field_file.name:
+            release_file(field_file, field_file.name)
@@ -0,0 +1,112 @@
+"""
+Content-addressed media storage.
+
+Every upload is hashed on the way in and stored once under
+'<upload_to>/<aa>/<bb>/<sha256><ext>', so re-uploading the same photo
+reuses the existing file and its URL never changes meaning. A MediaBlob
+row counts the references to each file; deleting a reference only removes
+the file once nothing points to it any more.
+
+Files are written under a temporary name and linked into place, so
+readers never see one half written and concurrent uploads of the same
+content store it once. The MediaBlob row doubles as the file's lock: it is
+kept at zero references, and a file is only unlinked, after the last
+reference's deletion commits, by an UPDATE that finds the row still
+unreferenced, which waits for any upload retaining it.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_content_addressed(name):
+    """Whether name is a content-hash path, and therefore immutable"""
+    return bool(HASHED_NAME_RE.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that deduplicates files by SHA-256 and refcounts them"""
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4], f'{digest}{extension}')
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save(), collisions are the point
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        with transaction.atomic():
+            # Holds the blob's row until commit, so it can't be unlinked meanwhile
+            self.retain(name, size=content.size)
+            if not self.exists(name):
+                self._store(name, content)
+        return name
+
+    def _store(self, name, content):
+        temp_name = super()._save(
+            os.path.join(os.path.dirname(name), f'.{uuid.uuid4().hex}.tmp'), content
+        )
+        try:
+            os.link(self.path(temp_name), self.path(name))
+        except FileExistsError:
+            # Stored concurrently from the same content
+            pass
+        finally:
+            os.remove(self.path(temp_name))
+
+    def retain(self, name, size=0):
+        """Record one more reference to name"""
+        from .models import MediaBlob
+
+        # Write first: locks the row, and on SQLite takes the write lock up
+        # front instead of failing to upgrade a read lock under contention
+        if MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+            return
+        blob, created = MediaBlob.objects.get_or_create(
+            name=name, defaults={'size': size, 'refcount': 1}
+        )
+        if not created:
+            MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        """Drop one reference to name, deleting the file with the last one"""
+        from .models import MediaBlob
+
+        if not name:
+            return
+        blobs = MediaBlob.objects.filter(name=name)
+        if not blobs.exists():
+            # Files stored before deduplication have no MediaBlob and one owner
+            super().delete(name)
+            return
+        with transaction.atomic():
+            updated = blobs.filter(refcount__gt=0).update(refcount=F('refcount') - 1)
+            if updated:
+                transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_unreferenced(self, name):
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            # Locks the row, and rechecks it, before the file goes
+            if MediaBlob.objects.filter(name=name, refcount=0).update(refcount=0):
+                super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
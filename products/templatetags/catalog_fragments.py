@@ -0,0 +1,49 @@
+from django import template
+
+from products.fragments import render_products, render_versioned
+from products.models import Brand, Category, Product
+
+register = template.Library()
+
+CARD_TEMPLATE = 'products/includes/product_card.html'
+FEATURED_TEMPLATE = 'products/includes/featured_products.html'
+SIDEBAR_TEMPLATE = 'products/includes/filter_sidebar.html'
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products, template_name=CARD_TEMPLATE):
+    """Render a card per product, each cached until its product, category or brand changes"""
+    return render_products(products, template_name, context.get('request'))
+
+
+@register.simple_tag(takes_context=True)
+def featured_products(context, limit=4):
+    """Render the featured products strip, cached until a catalog change bumps 'featured'"""
+    def get_context():
+        products = Product.objects.active().filter(featured=True).for_listing()[:limit]
+        return {'products': products, 'card_template': CARD_TEMPLATE}
+
+    return render_versioned(
+        FEATURED_TEMPLATE, ['featured'], [limit], get_context, context.get('request')
+    )
+
+
+@register.simple_tag(takes_context=True)
+def filter_sidebar(context):
+    """Render the category and brand filters, cached per selection until either list changes"""
+    request = context.get('request')
+    selected_category = request.GET.get('category', '') if request else ''
+    selected_brand = request.GET.get('brand', '') if request else ''
+
+    def get_context():
+        return {
+            'categories': Category.objects.filter(is_active=True).order_by('name'),
+            'brands': Brand.objects.filter(is_active=True).order_by('name'),
+            'selected_category': selected_category,
+            'selected_brand': selected_brand,
+        }
+
+    return render_versioned(
+        SIDEBAR_TEMPLATE, ['navigation'], [selected_category, selected_brand],
+        get_context, request
+    )
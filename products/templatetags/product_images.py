@@ -0,0 +1,42 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+# sizes attribute hint for each rendition size
+SIZES = {
+    'card': '(max-width: 576px) 100vw, 400px',
+    'detail': '(max-width: 768px) 100vw, 800px',
+    'zoom': '100vw',
+}
+
+
+@register.simple_tag
+def product_picture(product_image, size='card', alt='', css_class=''):
+    """
+    Render a <picture> for a ProductImage with WebP and original-format srcsets.
+
+    Until its renditions are generated the original upload is used as a plain <img>.
+    """
+    if not product_image or not product_image.image:
+        return ''
+    alt = alt or product_image.alt_text
+
+    formats = {rendition.format for rendition in product_image.renditions.all()}
+    if not formats:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy">',
+            product_image.image.url, alt, css_class
+        )
+
+    fallback = next((name for name in formats if name != 'webp'), 'webp')
+    sizes = SIZES.get(size, SIZES['card'])
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy">'
+        '</picture>',
+        product_image.get_srcset('webp'), sizes,
+        product_image.rendition_url(size, fallback),
+        product_image.get_srcset(fallback), sizes, alt, css_class
+    )
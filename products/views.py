@@ -4,30 +4,41 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q, Avg
-from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from .models import Product, Category, Brand, Review
 from .forms import ProductForm, ProductImageFormSet, ProductSearchForm, ReviewForm
+from .search import search_products
+from .storage import is_content_addressed
+from .conditional import (
+    CATALOG_NAMESPACE, ConditionalGetMixin, condition_on_versions, content_etag
+)
+from .fragments import product_namespaces
+from .autocomplete import VERSION_NAMESPACES as AUTOCOMPLETE_NAMESPACES, suggest
+from .quick_view import get_quick_view
+from .fuzzy import fuzzy_search_products, suggest_query
+from .page_cache import AnonymousPageCacheMixin, brand_listing_namespace, category_listing_namespace
+from .pagination import (
+    CachedCountPaginator, KeysetPaginator, clean_ordering, order_queryset, paginate,
+    wants_keyset, CURSOR_PARAM, RELEVANCE
+)
 from cart.forms import CartAddProductForm
 
-class ProductListView(ListView):
+class ProductListView(ConditionalGetMixin, ListView):
     model = Product
     template_name = 'products/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
+    paginator_class = CachedCountPaginator
     
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True, status='active')
+        queryset = Product.objects.active()
         
         # Search functionality
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query) |
-                Q(short_description__icontains=query)
-            )
+            queryset = search_products(queryset, query)
         
         # Category filter
         category_slug = self.request.GET.get('category')
@@ -47,29 +58,43 @@ class ProductListView(ListView):
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
         
-        # Sort
-        sort_by = self.request.GET.get('sort', '-created_at')
-        if sort_by:
-            queryset = queryset.order_by(sort_by)
+        # In stock filter
+        if self.request.GET.get('in_stock'):
+            queryset = queryset.orderable()
         
-        return queryset.select_related('category', 'brand')
+        # Sort, ranking search results by relevance unless asked otherwise
+        sort_by = clean_ordering(
+            self.request.GET.get('sort'),
+            default=RELEVANCE if query else '-created_at',
+            allow_relevance=bool(query)
+        )
+        queryset = order_queryset(queryset, sort_by)
+        self.sort_by = sort_by
+        
+        return queryset.for_listing()
+    
+    def paginate_queryset(self, queryset, page_size):
+        # Seek past the cursor instead of using OFFSET when one is given
+        if wants_keyset(self.request, self.sort_by):
+            paginator = KeysetPaginator(queryset, page_size, self.sort_by)
+            page = paginator.get_page(self.request.GET.get(CURSOR_PARAM))
+            return (paginator, page, page.object_list, page.has_other_pages())
+        return super().paginate_queryset(queryset, page_size)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(is_active=True)
-        context['brands'] = Brand.objects.filter(is_active=True)
+        # Filters and featured products are cached fragments, see catalog_fragments
         context['search_form'] = ProductSearchForm(self.request.GET)
-        context['featured_products'] = Product.objects.filter(
-            is_active=True, 
-            status='active', 
-            featured=True
-        )[:4]
         return context
 
-class ProductDetailView(DetailView):
+class ProductDetailView(ConditionalGetMixin, AnonymousPageCacheMixin, DetailView):
     model = Product
     template_name = 'products/product_detail.html'
     context_object_name = 'product'
+    page_cache_name = 'product'
+    
+    def get_queryset(self):
+        return Product.objects.for_detail()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -78,11 +103,10 @@ class ProductDetailView(DetailView):
         # Add to cart form
         context['cart_product_form'] = CartAddProductForm()
         
-        # Product reviews
+        # Product reviews, with the rating summary kept on the product
         context['reviews'] = product.reviews.filter(is_approved=True)
-        context['average_rating'] = product.reviews.filter(
-            is_approved=True
-        ).aggregate(Avg('rating'))['rating__avg'] or 0
+        context['average_rating'] = product.rating_average
+        context['rating_histogram'] = product.rating_histogram
         
         # Review form for authenticated users
         if self.request.user.is_authenticated:
@@ -91,14 +115,28 @@ class ProductDetailView(DetailView):
             if not existing_review:
                 context['review_form'] = ReviewForm()
         
-        # Related products
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            is_active=True,
-            status='active'
-        ).exclude(pk=product.pk)[:4]
+        # Frequently bought together, topped up from the same category
+        related_products = list(Product.objects.active().filter(
+            recommended_with__product=product
+        ).order_by('recommended_with__rank').for_listing()[:4])
+        if len(related_products) < 4:
+            related_products += Product.objects.active().filter(
+                category=product.category
+            ).exclude(
+                pk__in=[product.pk] + [related.pk for related in related_products]
+            ).for_listing()[:4 - len(related_products)]
+        context['related_products'] = related_products
         
         return context
+    
+    def get_page_cache_namespaces(self, context):
+        namespaces = super().get_page_cache_namespaces(context) + product_namespaces(self.object)
+        for related in context['related_products']:
+            namespaces += product_namespaces(related)
+        # Fewer than four recommendations are topped up from the category
+        if self.object.category_id:
+            namespaces.append(category_listing_namespace(self.object.category_id))
+        return namespaces
 
 class ProductCreateView(LoginRequiredMixin, CreateView):
     model = Product
@@ -181,56 +219,75 @@ class ProductDeleteView(LoginRequiredMixin, DeleteView):
     def get_queryset(self):
         return Product.objects.filter(vendor=self.request.user)
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(ConditionalGetMixin, AnonymousPageCacheMixin, DetailView):
     model = Category
     template_name = 'products/category_detail.html'
     context_object_name = 'category'
+    page_cache_name = 'category'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         category = self.object
         
-        # Get products in this category
-        products = Product.objects.filter(
-            category=category,
-            is_active=True,
-            status='active'
-        ).select_related('brand')
+        # Breadcrumbs and subcategory menu
+        context['breadcrumbs'] = category.get_ancestors()
+        context['subcategories'] = category.children.filter(is_active=True)
+        
+        # Get products in this category and all of its subcategories
+        products = Product.objects.active().filter(
+            category.subtree_q('category__')
+        ).for_listing().order_by('-created_at', '-id')
         
         # Pagination
-        paginator = Paginator(products, 12)
-        page_number = self.request.GET.get('page')
-        context['products'] = paginator.get_page(page_number)
+        context['products'] = paginate(self.request, products, 12, '-created_at')
         
         return context
+    
+    def get_page_cache_namespaces(self, context):
+        namespaces = super().get_page_cache_namespaces(context) + [
+            f'category:{self.object.pk}',
+            category_listing_namespace(self.object.pk),
+        ]
+        for product in context['products']:
+            namespaces += product_namespaces(product)
+        return namespaces
 
-class BrandDetailView(DetailView):
+class BrandDetailView(ConditionalGetMixin, AnonymousPageCacheMixin, DetailView):
     model = Brand
     template_name = 'products/brand_detail.html'
     context_object_name = 'brand'
+    page_cache_name = 'brand'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         brand = self.object
         
         # Get products from this brand
-        products = Product.objects.filter(
-            brand=brand,
-            is_active=True,
-            status='active'
-        ).select_related('category')
+        products = Product.objects.active().filter(
+            brand=brand
+        ).for_listing().order_by('-created_at', '-id')
         
         # Pagination
-        paginator = Paginator(products, 12)
-        page_number = self.request.GET.get('page')
-        context['products'] = paginator.get_page(page_number)
+        context['products'] = paginate(self.request, products, 12, '-created_at')
         
         return context
+    
+    def get_page_cache_namespaces(self, context):
+        namespaces = super().get_page_cache_namespaces(context) + [
+            f'brand:{self.object.pk}',
+            brand_listing_namespace(self.object.pk),
+        ]
+        for product in context['products']:
+            namespaces += product_namespaces(product)
+        return namespaces
 
+@condition_on_versions(lambda request: [CATALOG_NAMESPACE])
 def product_search(request):
     """Advanced product search"""
     form = ProductSearchForm(request.GET)
-    products = Product.objects.filter(is_active=True, status='active')
+    products = Product.objects.active().for_listing()
+    query = None
+    sort_by = None
     
     if form.is_valid():
         query = form.cleaned_data.get('query')
@@ -240,13 +297,12 @@ def product_search(request):
         max_price = form.cleaned_data.get('max_price')
         in_stock_only = form.cleaned_data.get('in_stock_only')
         sort_by = form.cleaned_data.get('sort_by')
+        fuzzy = form.cleaned_data.get('fuzzy')
         
-        if query:
-            products = products.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query) |
-                Q(short_description__icontains=query)
-            )
+        if query and fuzzy:
+            products = fuzzy_search_products(products, query)
+        elif query:
+            products = search_products(products, query)
         
         if category:
             products = products.filter(category=category)
@@ -261,21 +317,28 @@ def product_search(request):
             products = products.filter(price__lte=max_price)
         
         if in_stock_only:
-            products = products.filter(stock__gt=0)
+            products = products.orderable()
         
         if sort_by:
-            products = products.order_by(sort_by)
+            products = order_queryset(products, clean_ordering(sort_by))
+        elif query:
+            sort_by = RELEVANCE
+            products = order_queryset(products, sort_by)
     
     # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, products, 12, sort_by or '-created_at')
+    
+    # Offer a spelling correction when nothing matched
+    suggestion = None
+    if query and not page_obj.object_list:
+        suggestion = suggest_query(query)
     
     return render(request, 'products/product_search.html', {
         'form': form,
         'products': page_obj,
         'page_obj': page_obj,
         'query': request.GET.get('query', ''),
+        'suggestion': suggestion,
     })
 
 @login_required
@@ -305,4 +368,32 @@ def add_review(request, slug):
     return render(request, 'products/add_review.html', {
         'form': form,
         'product': product
-    })
\ No newline at end of file
+    })
+
+@condition_on_versions(lambda request: AUTOCOMPLETE_NAMESPACES)
+def search_suggestions(request):
+    """Search-as-you-type suggestions, served from the in-memory autocomplete index"""
+    query = request.GET.get('q', '').strip()
+    results = suggest(query) if len(query) >= 2 else []
+    response = JsonResponse({'results': results})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+def product_quick_view(request, pk):
+    """Quick-view JSON for a product card, read from its cached serialization"""
+    data = get_quick_view(pk)
+    if not data:
+        raise Http404('No such product')
+    response = JsonResponse(data)
+    patch_cache_control(response, public=True, max_age=60)
+    return content_etag(request, response)
+
+# Content-addressed files never change, so browsers may keep them for a year
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+def serve_media(request, path, document_root=None):
+    """Serve uploaded media in development, with far-future caching for hashed files"""
+    response = serve(request, path, document_root=document_root)
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, max_age=MEDIA_CACHE_MAX_AGE, immutable=True)
+    return response
@@ -83,6 +83,16 @@ function performSearch(query) {
         });
 }
 
+// Escape a value for interpolation into HTML text or a quoted attribute
+function escapeHTML(value) {
+    return String(value ?? '')
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
 // Display search suggestions
 function displaySearchSuggestions(results) {
     const suggestionsContainer = document.getElementById('searchSuggestions');
@@ -94,13 +104,13 @@ function displaySearchSuggestions(results) {
     }
     
     suggestionsContainer.innerHTML = results.map(result => `
-        <a href="/product/${result.id}/" class="list-group-item list-group-item-action">
+        <a href="${escapeHTML(result.url)}" class="list-group-item list-group-item-action">
             <div class="d-flex align-items-center">
-                <img src="${result.image || '/static/images/default-product.jpg'}" 
-                     alt="${result.name}" class="me-3" style="width: 40px; height: 40px; object-fit: cover;">
+                <img src="${escapeHTML(result.image || '/static/images/default-product.jpg')}" 
+                     alt="${escapeHTML(result.name)}" class="me-3" style="width: 40px; height: 40px; object-fit: cover;">
                 <div>
-                    <h6 class="mb-0">${result.name}</h6>
-                    <small class="text-muted">$${result.price}</small>
+                    <h6 class="mb-0">${escapeHTML(result.name)}</h6>
+                    <small class="text-muted">$${escapeHTML(result.price)}</small>
                 </div>
             </div>
         </a>
@@ -124,7 +134,12 @@ function initializeQuickView() {
 // Load product quick view
 function loadQuickView(productId) {
     fetch(`/api/product/${productId}/quick-view/`)
-        .then(response => response.json())
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Quick view unavailable (${response.status})`);
+            }
+            return response.json();
+        })
         .then(data => {
             displayQuickView(data);
         })
@@ -135,29 +150,38 @@ function loadQuickView(productId) {
 
 // Display quick view modal
 function displayQuickView(product) {
+    const comparePrice = product.compare_price
+        ? `<del class="text-muted ms-2">$${escapeHTML(product.compare_price)}</del> <span class="badge bg-danger">-${escapeHTML(product.discount)}%</span>`
+        : '';
+    const rating = product.rating.count
+        ? `<p class="text-warning"><i class="fas fa-star"></i> ${escapeHTML(product.rating.average)} <span class="text-muted">(${escapeHTML(product.rating.count)})</span></p>`
+        : '';
+    const maxQuantity = product.stock === null ? '' : `max="${escapeHTML(product.stock)}"`;
     const modalHTML = `
         <div class="modal fade" id="quickViewModal" tabindex="-1">
             <div class="modal-dialog modal-lg">
                 <div class="modal-content">
                     <div class="modal-header">
-                        <h5 class="modal-title">${product.name}</h5>
+                        <h5 class="modal-title">${escapeHTML(product.name)}</h5>
                         <button type="button" class="btn-close" data-bs-dismiss="modal"></button>
                     </div>
                     <div class="modal-body">
                         <div class="row">
                             <div class="col-md-6">
-                                <img src="${product.image}" alt="${product.name}" class="img-fluid">
+                                ${product.image ? `<img src="${escapeHTML(product.image)}" alt="${escapeHTML(product.name)}" class="img-fluid">` : ""}
                             </div>
                             <div class="col-md-6">
-                                <p class="text-muted">${product.description}</p>
-                                <h4 class="text-success">$${product.price}</h4>
-                                <form class="add-to-cart-form" data-product-id="${product.id}">
+                                <p class="text-muted">${escapeHTML(product.description)}</p>
+                                ${rating}
+                                <h4 class="text-success">$${escapeHTML(product.price)}${comparePrice}</h4>
+                                <form class="add-to-cart-form" data-product-id="${escapeHTML(product.id)}">
                                     <div class="mb-3">
                                         <label for="quantity" class="form-label">Quantity:</label>
-                                        <input type="number" class="form-control" name="quantity" value="1" min="1" max="${product.stock}">
+                                        <input type="number" class="form-control" name="quantity" value="1" min="1" ${maxQuantity}>
                                     </div>
-                                    <button type="submit" class="btn btn-primary">Add to Cart</button>
+                                    <button type="submit" class="btn btn-primary" ${product.in_stock ? '' : 'disabled'}>Add to Cart</button>
                                 </form>
+                                <a href="${escapeHTML(product.url)}" class="btn btn-link px-0 mt-2">View details</a>
                             </div>
                         </div>
                     </div>